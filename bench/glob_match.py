@@ -0,0 +1,84 @@
+# Compares GlobMatcher with the fnmatch loops it replaced, matching synthetic
+# release paths against a set of clean-style patterns.
+#
+#   python bench/glob_match.py [--paths N] [--repeat N]
+
+import os
+import sys
+import time
+import random
+import fnmatch
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from livepm.lib.globmatcher import GlobMatcher
+
+DIRS = [
+    'lib', 'bin', 'plugins/imageformats', 'plugins/platforms', 'qml/QtQuick/Controls', 'qml/QtQuick.2',
+    'Frameworks/QtCore.framework/Versions/5', 'include/opencv2/core', 'share/doc', 'mkspecs/features'
+]
+EXTENSIONS = [
+    '.so', '.so.5', '.dylib', '.a', '.h', '.hpp', '.qml', '.qmlc', '.js', '.pri', '.prf', '.txt', '.debug',
+    '.dSYM', '.pdb', '.lib', '.dll', '.exe', '.png', '.json'
+]
+
+def word(rng, low, high):
+    return ''.join(rng.choice('abcdefghijklmnop') for _ in range(rng.randint(low, high)))
+
+def paths(rng, count):
+    return [
+        '/build/release/' + rng.choice(DIRS) + '/' + rng.choice(['lib', 'Qt', 'q', 'opencv_', '']) + word(rng, 3, 12) + rng.choice(EXTENSIONS)
+        for _ in range(count)
+    ]
+
+def patterns(rng):
+    result = ['*.' + e for e in ['pdb', 'ilk', 'exp', 'debug', 'dSYM', 'prl', 'la', 'pc', 'cmake', 'orig', 'rej', 'bak', 'tmp', 'log', 'obj', 'o']]
+    result += ['*/' + d + '/*' for d in ['doc', 'docs', 'examples', 'tests', 'demos', 'translations', 'cmake', 'pkgconfig', 'mkspecs', 'include']]
+    result += ['*/lib*_debug.*', '*/lib*d.dll', '*d.lib', '*/Qt*Test*', '*/qml/*/designer/*', '*/plugins/sqldrivers/*', '*/plugins/*/lib*d.dylib', '*.qmlc', '*.jsc', '*_p.h']
+    result += ['*/' + word(rng, 5, 5) + '*.' + rng.choice(['so', 'h', 'qml']) for _ in range(50 - len(result))]
+    return result
+
+def fnmatch_loop(paths, patterns):
+    # First matching pattern of each path, as the steps looked it up before
+    matched = []
+    for path in paths:
+        for pattern in patterns:
+            if fnmatch.fnmatch(path, pattern):
+                matched.append(pattern)
+                break
+        else:
+            matched.append(None)
+    return matched
+
+def glob_matcher(paths, patterns):
+    matcher = GlobMatcher(patterns)
+    return [matcher.match(path) for path in paths]
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark glob pattern matching.')
+    parser.add_argument('--paths', type=int, default=100000, help='Number of paths to match.')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs of each matcher, the best one is reported.')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    pathlist = paths(rng, args.paths)
+    patternlist = patterns(rng)
+
+    results = {}
+    for name, match in (('fnmatch loop', fnmatch_loop), ('GlobMatcher', glob_matcher)):
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            results[name] = match(pathlist, patternlist)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        matches = len([pattern for pattern in results[name] if pattern is not None])
+        print('{:<14} {:.3f}s, {} of {} paths matched by {} patterns'.format(name + ':', best, matches, len(pathlist), len(patternlist)))
+
+    if results['fnmatch loop'] != results['GlobMatcher']:
+        print('Matched patterns differ')
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+# Compares Process.trace, which pumps child output through OutputPump, with
+# the poll and readline loop it replaced, on a child printing compiler-like
+# lines. Output goes to a temporary file instead of the terminal.
+#
+#   python bench/output_pump.py [--lines N]
+
+import os
+import sys
+import time
+import tempfile
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from livepm.lib.process import Process
+from livepm.lib.outputpump import OutputPump
+
+CHILD = (
+    "import sys\n"
+    "out = sys.stdout\n"
+    "for i in range({lines}):\n"
+    "    out.write('g++ -c -pipe -O2 -std=gnu++11 -Wall -fPIC -I../include -o obj/file' + str(i) + '.o src/file' + str(i) + '.cpp\\n')\n"
+)
+
+def legacy_trace(preffix, proc, end='\n'):
+    while proc.poll() is None:
+        line = proc.stdout.readline()
+        if line:
+            print(preffix + line, end=end)
+    line = proc.stdout.readline()
+    while( line ):
+        print(preffix + line, end=end)
+        line = proc.stdout.readline()
+
+def selector_trace(preffix, proc):
+    pump = OutputPump()
+    pump.add(proc.stdout, preffix)
+    pump.run_selector()
+    return Process.wait(proc)
+
+def thread_trace(preffix, proc):
+    pump = OutputPump()
+    pump.add(proc.stdout, preffix)
+    pump.run_threads()
+    return Process.wait(proc)
+
+def measure(trace, lines, path):
+    command = [sys.executable, '-c', CHILD.format(lines=lines)]
+    stdout = sys.stdout
+    with open(path, 'w') as out:
+        sys.stdout = out
+        try:
+            start = time.perf_counter()
+            cpu = time.process_time()
+            proc = Process.run(command, os.getcwd())
+            if trace is legacy_trace:
+                trace('MAKE: ', proc, end='')
+                proc.wait()
+            else:
+                trace('MAKE: ', proc)
+            cpu = time.process_time() - cpu
+            wall = time.perf_counter() - start
+        finally:
+            sys.stdout = stdout
+    with open(path, 'rb') as f:
+        return wall, cpu, f.read()
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark child output pumping.')
+    parser.add_argument('--lines', type=int, default=500000, help='Number of lines the child prints.')
+    args = parser.parse_args()
+
+    # Pipes can only be selected on POSIX
+    traces = [('old Process.trace', legacy_trace)]
+    if os.name == 'posix':
+        traces.append(('selector pump', selector_trace))
+    traces.append(('reader threads', thread_trace))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        expected = None
+        for name, trace in traces:
+            wall, cpu, output = measure(trace, args.lines, os.path.join(tmp, 'out'))
+            if expected is None:
+                expected = output
+            print('{:<20} wall {:.2f}s, parent cpu {:.2f}s'.format(name + ':', wall, cpu) + ('' if output == expected else ', OUTPUT DIFFERS'))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+# Compares DependencyTree.build_order with the fixed-point resolver it
+# replaced, on synthetic dependency trees.
+#
+#   python bench/toposort.py [--timeout SECONDS]
+
+import os
+import sys
+import time
+import random
+import signal
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from livepm.lib.dependencytree import DependencyTree
+
+class LegacyDependencyTree:
+
+    def __init__(self, tree):
+        self.tree = tree
+
+    def build_order(self):
+        self.order = []
+
+        order_solved = False
+        while not order_solved:
+            order_solved = True
+            for key, value in self.tree.items():
+                if not self._solve_build_order(key, value):
+                    order_solved = False
+
+        return self.order
+
+    def _solve_build_order(self, name, node):
+        build_order_solved = True
+
+        if len(node) == 0:
+            if name not in self.order:
+                self.order.append(name)
+        else:
+            has_all_deps = True
+
+            for key, value in node.items():
+                if not self._solve_build_order(key, value):
+                    build_order_solved = False
+
+                if key not in self.order:
+                    has_all_deps = False
+
+            if has_all_deps and name not in self.order:
+                self.order.append(name)
+            if not has_all_deps:
+                build_order_solved = False
+
+        return build_order_solved
+
+def nested(graph, roots):
+    # Nested tree as Builder.create_dependency_tree makes it, where the
+    # subtree of a package is shared by every package depending on it
+    nodes = {}
+    for name in reversed(list(graph)):
+        nodes[name] = {}
+    for name, depends in graph.items():
+        for depend in depends:
+            nodes[name][depend] = nodes[depend]
+    return { root : nodes[root] for root in roots }
+
+def chain(n):
+    graph = { 'p' + str(i) : (['p' + str(i + 1)] if i + 1 < n else []) for i in range(n) }
+    return nested(graph, ['p0'])
+
+def diamonds(depth):
+    # Each level has two packages depending on both packages of the next one
+    graph = {}
+    for level in range(depth):
+        for side in 'ab':
+            graph[side + str(level)] = ['a' + str(level + 1), 'b' + str(level + 1)] if level + 1 < depth else []
+    return nested(graph, ['a0', 'b0'])
+
+def random_dag(n, degree, seed = 1):
+    rng = random.Random(seed)
+    graph = {}
+    for i in range(n):
+        candidates = range(i + 1, n)
+        graph['p' + str(i)] = ['p' + str(j) for j in rng.sample(candidates, min(degree, len(candidates)))]
+    return nested(graph, ['p' + str(i) for i in range(n)])
+
+class Timeout(Exception):
+    pass
+
+def timed(resolver, tree, timeout):
+    def expire(signum, frame):
+        raise Timeout()
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    start = time.perf_counter()
+    try:
+        order = resolver(tree).build_order()
+        return time.perf_counter() - start, order
+    except Timeout:
+        return None, None
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark dependency build order resolution.')
+    parser.add_argument('--timeout', type=float, default=30, help='Time limit of each run in seconds.')
+    args = parser.parse_args()
+
+    cases = [
+        ('chain of 900', chain(900)),
+        ('diamonds of depth 18', diamonds(18)),
+        ('diamonds of depth 22', diamonds(22)),
+        ('random DAG of 5000 x 3', random_dag(5000, 3))
+    ]
+    sys.setrecursionlimit(10000)
+    for name, tree in cases:
+        old, oldorder = timed(LegacyDependencyTree, tree, args.timeout)
+        new, neworder = timed(DependencyTree, tree, args.timeout)
+        line = '{:<24}'.format(name)
+        line += ' old ' + ('{:.3f}s'.format(old) if old is not None else '>' + str(args.timeout) + 's')
+        line += ', new ' + ('{:.3f}s'.format(new) if new is not None else '>' + str(args.timeout) + 's')
+        if oldorder is not None and neworder is not None:
+            line += ', same order' if oldorder == neworder else ', ORDER DIFFERS'
+        print(line)
+
+if __name__ == '__main__':
+    main()
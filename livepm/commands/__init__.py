@@ -14,6 +14,9 @@ from livepm.commands.uninstall import UninstallCommand
 from livepm.commands.update import UpdateCommand
 from livepm.commands.show import ShowCommand
 from livepm.commands.showremote import RemoteShowCommand
+from livepm.commands.stats import StatsCommand
+from livepm.commands.cacheserver import CacheServerCommand
+from livepm.commands.daemon import DaemonCommand
 
 commands_order = [
     BuildCommand,
@@ -30,7 +33,10 @@ commands_order = [
     UninstallCommand,
     UpdateCommand,
     ShowCommand,
-    RemoteShowCommand
+    RemoteShowCommand,
+    StatsCommand,
+    CacheServerCommand,
+    DaemonCommand
 ]  
 
 stored_commands = {c.name: c for c in commands_order}
@@ -8,6 +8,15 @@ import argparse
 from livepm.lib.builder import Builder
 from livepm.lib.command import Command
 from livepm.lib.configuration import Configuration
+from livepm.lib.jobserver import JobServer
+from livepm.lib.steprunner import StepError
+from livepm.lib.buildtrace import BuildTrace
+from livepm.lib.gitmirror import GitMirror
+from livepm.lib.artifactstore import ArtifactStore
+from livepm.lib.remotecache import RemoteCache
+from livepm.lib.prebuiltrelease import PrebuiltRelease
+from livepm.lib.packageregistry import PackageRegistry
+from livepm.lib.buildscheduler import BuildScheduler
 
 class BuildCommand(Command):
     name = 'build'
@@ -21,20 +30,127 @@ class BuildCommand(Command):
         parser.add_argument('--source', '-s', default=None, help='Path to source directory.')
         parser.add_argument('--options', '-o', default=None, help='Specific build options')
         parser.add_argument('--build', '-b', default='', help='Custom build directory. Default directory is build.')
+        parser.add_argument('--jobs', '-j', type=int, default=None, help='Number of parallel jobs shared by dependency builds and make. Defaults to the number of cores.')
+        parser.add_argument('--clean', default=False, action='store_true', help='Remove release dirs before building instead of building incrementally.')
+        parser.add_argument('--quiet', '-q', default=False, action='store_true', help='Write step output to compressed logs in the release dir and only print step status.')
+        parser.add_argument('--tail', type=int, default=100, help='Number of output lines shown for a failed step in quiet mode.')
+        parser.add_argument('--trace', default=None, help='Write a Trace Event Format timeline of the build to the given file.')
+        parser.add_argument('--git-cache', default=GitMirror.default_dir(), help='Directory of bare mirrors that dependencies are cloned from by reference. Defaults to $LIVEPM_GIT_CACHE.')
+        parser.add_argument('--depth', type=int, default=None, help='Make shallow clones of dependencies with the given history depth.')
+        parser.add_argument('--artifact-store', default=ArtifactStore.default_dir(), help='Directory of built dependencies shared between projects. Defaults to $LIVEPM_ARTIFACT_STORE.')
+        parser.add_argument('--artifact-store-size', type=float, default=20, help='Size limit of the artifact store in GB.')
+        parser.add_argument('--remote-cache', default=RemoteCache.default_url(), help='Url of a remote build cache to fetch built dependencies from and upload them to. Defaults to $LIVEPM_REMOTE_CACHE.')
+        parser.add_argument('--prebuilt-deps', default=False, action='store_true', help='Install the -dev releases of dependencies from the registry, and only build the ones without a matching release.')
+        parser.add_argument('--server_url', '-sU', default=PrebuiltRelease.server_url, help='Change server url.')
+        parser.add_argument('--releases', default=None, help='Comma separated release ids to build in parallel from the same source dir.')
+        parser.add_argument('--resume', default=False, action='store_true', help='Continue the last build run from the first build step that did not complete.')
+        partial = parser.add_mutually_exclusive_group()
+        partial.add_argument('--only', default=None, metavar='DEPENDENCY', help='Only build the given dependency, using the existing release dirs of the others.')
+        partial.add_argument('--downstream', default=None, metavar='DEPENDENCY', help='Only build the given dependency and the packages that depend on it.')
+        partial.add_argument('--upstream', default=None, metavar='DEPENDENCY', help='Only build the given dependency and the packages it depends on.')
         parser.add_argument('package_path', default='', help="Path to a livekeys package or package file.")
-        parser.add_argument('release_id', default='', help="Id of release.")
+        parser.add_argument('release_id', default=None, nargs='?', help="Id of release.")
 
         args = parser.parse_args(argv)
 
         self.package_file = Configuration.findpackage(os.path.abspath(args.package_path))
-        self.release_id   = args.release_id
+        self.release_ids  = [r.strip() for r in args.releases.split(',') if r.strip()] if args.releases else []
+        if args.release_id and args.release_id not in self.release_ids:
+            self.release_ids.insert(0, args.release_id)
+        if len(self.release_ids) == 0:
+            parser.error('a release id or --releases is required')
         self.source_dir   = args.source if args.source else os.path.dirname(self.package_file)
         self.build_dir    = args.build if args.build else self.source_dir + '/build'
         self.options      = args.options
+        self.jobs         = args.jobs if args.jobs else (os.cpu_count() or 1)
+        self.clean        = args.clean
+        self.resume       = args.resume
+        if self.resume and self.clean:
+            parser.error('--resume can\'t be used with --clean')
+
+        self.quiet        = args.quiet
+        self.tail         = args.tail
+        self.trace        = os.path.abspath(args.trace) if args.trace else None
+        self.git_cache    = args.git_cache
+        self.depth        = args.depth
+        self.artifact_store      = args.artifact_store
+        self.artifact_store_size = int(args.artifact_store_size * 1024 * 1024 * 1024)
+        self.remote_cache        = args.remote_cache
+        self.prebuilt_deps       = args.prebuilt_deps
+        self.server_url          = args.server_url
+
+        self.partial = None
+        if args.only:
+            self.partial = ('only', args.only)
+        elif args.downstream:
+            self.partial = ('downstream', args.downstream)
+        elif args.upstream:
+            self.partial = ('upstream', args.upstream)
 
         self.source_dir = os.path.abspath(self.source_dir)
 
     def __call__(self):
-        b = Builder(self.package_file, self.release_id)
+        if self.trace:
+            BuildTrace.start()
+        try:
+            self.build()
+        finally:
+            if self.trace:
+                BuildTrace.stop(self.trace)
+
+    def create_builder(self, release_id, registry):
+        b = Builder(self.package_file, release_id, registry)
         b.deploy_to_livekeys = False
+        b.jobs = self.jobs
+        b.clean = self.clean
+        b.quiet = self.quiet
+        b.tail = self.tail
+        b.partial = self.partial
+        b.resume = self.resume
+        if self.artifact_store:
+            b.artifacts = ArtifactStore(self.artifact_store, self.artifact_store_size)
+        if self.remote_cache:
+            b.remote_cache = RemoteCache(self.remote_cache)
+        if self.prebuilt_deps:
+            b.prebuilt_release = PrebuiltRelease(self.server_url)
+        return b
+
+    def build(self):
+        # Releases share one registry, so each dependency is cloned once even
+        # when several releases are built at the same time
+        registry = PackageRegistry()
+        if self.git_cache:
+            registry.clone_options['mirror'] = GitMirror(self.git_cache)
+        if self.depth:
+            registry.clone_options['depth'] = self.depth
+
+        builders = {}
+        releasedirs = {}
+        for release_id in self.release_ids:
+            b = self.create_builder(release_id, registry)
+            releasedir = os.path.abspath(os.path.join(self.build_dir, b.release.compiler))
+            if releasedir in releasedirs:
+                raise Exception("Releases " + releasedirs[releasedir] + " and " + release_id + " would both build in \'" + releasedir + "\'")
+            builders[release_id] = b
+            releasedirs[releasedir] = release_id
+
+        jobserver = JobServer.start(self.jobs)
+        if jobserver:
+            print('Jobserver started with ' + str(jobserver.jobs) + ' jobs')
+        try:
+            if len(builders) == 1:
+                b = builders[self.release_ids[0]]
+                b(self.source_dir, os.path.join(self.build_dir, b.release.compiler), self.options)
+            else:
+                print('\nBuilding releases in parallel: ' + ', '.join(self.release_ids))
+                scheduler = BuildScheduler({ release_id : [] for release_id in self.release_ids }, self.release_ids, len(self.release_ids))
+                scheduler(lambda release_id: self.build_release(builders[release_id], scheduler.cancelled))
+        except StepError as e:
+            print('\nBuild failed: ' + str(e.result))
+            sys.exit(1)
+        finally:
+            JobServer.stop()
+
+    def build_release(self, b, cancelled):
+        b.cancelled = cancelled
         b(self.source_dir, os.path.join(self.build_dir, b.release.compiler), self.options)
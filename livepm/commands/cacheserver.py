@@ -0,0 +1,17 @@
+from livepm.lib.command import Command
+from livepm.lib.remotecacheserver import main as serve
+
+class CacheServerCommand(Command):
+    name = 'cacheserver'
+    description = 'Serve a remote build cache'
+
+    def __init__(self):
+        pass
+
+    def parse_args(self, argv):
+        # Arguments are parsed by the server, which can also be run on its own
+        # with python livepm/lib/remotecacheserver.py
+        self.argv = argv
+
+    def __call__(self):
+        serve(self.argv)
@@ -0,0 +1,35 @@
+import argparse
+
+from livepm.lib.command import Command
+from livepm.lib.daemon import Daemon
+
+class DaemonCommand(Command):
+    name = 'daemon'
+    description = 'Run commands from a background process that keeps its caches warm'
+
+    def __init__(self):
+        pass
+
+    def parse_args(self, argv):
+        parser = argparse.ArgumentParser(
+            description='Serve livepm commands over a Unix socket. While the daemon runs, livepm forwards commands to it, '
+                        'which saves the startup and keeps parsed package files, directory listings and Mach-O link info '
+                        'between commands. Set LIVEPM_NO_DAEMON to run a command in process instead. Restart the daemon '
+                        'after updating livepm.')
+        parser.add_argument('--socket', '-s', default=None, help='Path of the socket. Defaults to $LIVEPM_DAEMON_SOCKET or ~/.livepm/daemon.sock.')
+        parser.add_argument('--stop', default=False, action='store_true', help='Stop the daemon serving the socket.')
+
+        args = parser.parse_args(argv)
+
+        self.socket = args.socket if args.socket else Daemon.default_path()
+        self.stop   = args.stop
+
+    def __call__(self):
+        if self.stop:
+            if Daemon.stop(self.socket):
+                print('Stopped daemon at \'' + self.socket + '\'')
+            else:
+                print('No daemon running at \'' + self.socket + '\'')
+            return
+
+        Daemon(self.socket).serve()
@@ -9,10 +9,16 @@ from livepm.lib.command import Command
 from livepm.lib.configuration import Configuration
 from livepm.lib.process import *
 from livepm.lib.filesystem import FileSystem
+from livepm.lib.steprunner import StepRunner, StepError
+from livepm.lib.buildtrace import BuildTrace
+from livepm.lib.stepcache import StepCache
+from livepm.lib.copyengine import CopyEngine
+from livepm.lib.releaseclean import ReleaseClean
 
 class DeployCommand(Command):
     name = 'deploy'
     description = 'Deploy and pack a live package'
+    external_steps = ['run', 'make', 'nmake', 'qmake', 'livedoc']
 
     def __init__(self):
         pass
@@ -23,6 +29,12 @@ class DeployCommand(Command):
         parser.add_argument('--options', '-o', default=None, help='Specific deploy options.')
         parser.add_argument('--build', '-b', default=None, help='Custom build directory. Default directory is build.')
         parser.add_argument('--makedoc', default=None, help='Enable documentation generation.')
+        parser.add_argument('--quiet', '-q', default=False, action='store_true', help='Write step output to compressed logs in the release dir and only print step status.')
+        parser.add_argument('--tail', type=int, default=100, help='Number of output lines shown for a failed step in quiet mode.')
+        parser.add_argument('--trace', default=None, help='Write a Trace Event Format timeline of the deployment to the given file.')
+        parser.add_argument('--incremental', '-i', default=False, action='store_true', help='Update the deploy dir of the previous deployment instead of recreating it. Copy steps only copy changed files, and remove the ones whose source is gone.')
+        parser.add_argument('--link', default='copy', choices=FileSystem.link_strategies, help='Stage files of copy steps as copies, hardlinks or reflinks. Links fall back to copies where the filesystem doesn\'t support them. Steps that write to staged files break their links first. Hardlinks can\'t be used with run, make, qmake or livedoc deploy steps, whose tools may change staged files in place.')
+        parser.add_argument('--clean-dry-run', default=False, action='store_true', help='Only list what the clean steps would remove from the deploy dir of the previous deployment, and the bytes they would reclaim. Nothing is removed, no other step runs and no archive is written.')
         parser.add_argument('package_path', default='', help="Path to a livekeys package or package file.")
         parser.add_argument('release_id', default='', help="Id of release.")
 
@@ -34,10 +46,30 @@ class DeployCommand(Command):
         self.build_dir    = args.build if args.build else self.source_dir + '/build'
         self.makedoc      = args.makedoc if args.makedoc else None
 
+        self.incremental  = args.incremental
+        self.link         = args.link
+        self.clean_dry_run = args.clean_dry_run
+        self.quiet        = args.quiet
+        self.tail         = args.tail
+        self.trace        = os.path.abspath(args.trace) if args.trace else None
+
         self.source_dir = os.path.abspath(self.source_dir)
         # usage = 'Usage: livekeys_deploypy [-b <self.build_dir>] <buildfile> <self.release_id>'
 
     def __call__(self):
+        if self.trace:
+            BuildTrace.start()
+        CopyEngine.strategy = self.link
+        ReleaseClean.dry_run = self.clean_dry_run
+        try:
+            self.deploy()
+        finally:
+            CopyEngine.strategy = 'copy'
+            ReleaseClean.dry_run = False
+            if self.trace:
+                BuildTrace.stop(self.trace)
+
+    def deploy(self):
 
         print('\nParsing build file \'' + self.package_file + '\'...')
 
@@ -48,27 +80,50 @@ class DeployCommand(Command):
         if ( not config.has_release(self.release_id) ):
             raise Exception("Failed to find release id:" + self.release_id)
 
-        print('  Version:' + str(config.version))
-        print('  Modules:')
-        for key, value in config.components.items():
-            print('   * ' + str(value))
+        if not self.quiet:
+            print('  Version:' + str(config.version))
+            print('  Modules:')
+            for key, value in config.components.items():
+                print('   * ' + str(value))
 
-        print('  Dependencies:')
-        for value in config.dependencies:
-            print('   * ' + str(value))
+            print('  Dependencies:')
+            for value in config.dependencies:
+                print('   * ' + str(value))
 
         release = config.release(self.release_id)
         releasedir = os.path.abspath(os.path.join(self.build_dir, release.compiler))
 
-        print('\nConfiguration found: ' + self.release_id)
-        print('  Source dir: \'' + self.source_dir + '\'')
-        print('  Release dir: \'' + releasedir + '\'')
-        print('  Compiler: \'' + release.compiler + '\'')
+        with BuildTrace.span('deploy ' + config.name, 'deploy', { "package" : config.name, "release" : self.release_id }):
+            self.deploy_release(release, releasedir)
+
+    def clean_dry_run_steps(self, release, releasedir, deploydirroot):
+        # Only the clean steps run, over the deploy dir of the previous
+        # deployment, and nothing is written
+        if not os.path.isdir(deploydirroot):
+            print('\nNo deploy dir to clean: \'' + deploydirroot + '\'')
+            return
+
+        print('\nListing what clean steps would remove from: \'' + deploydirroot + '\'')
+        for index, action in enumerate(release.deploysteps):
+            if action.name == 'clean':
+                print('\nStep ' + str(index) + ': clean')
+                action(self.source_dir, releasedir, os.environ)
+
+        print('\nDry run: other deploy steps and the archive were skipped')
+
+    def deploy_release(self, release, releasedir):
 
         release.init_environment()
-        print('  Environment:')
-        for key, value in release.environment.items():
-            print('   * ' + key + '[' + value + ']: \'' + os.environ[key] + '\'')
+
+        if not self.quiet:
+            print('\nConfiguration found: ' + self.release_id)
+            print('  Source dir: \'' + self.source_dir + '\'')
+            print('  Release dir: \'' + releasedir + '\'')
+            print('  Compiler: \'' + release.compiler + '\'')
+
+            print('  Environment:')
+            for key, value in release.environment.items():
+                print('   * ' + key + '[' + value + ']: \'' + os.environ[key] + '\'')
 
         buildname = release.release_name()
         deploydir = os.path.abspath(releasedir + '/../' + buildname)
@@ -78,27 +133,49 @@ class DeployCommand(Command):
         if releasename == 'livekeys' and sys.platform.lower() == 'darwin':
             deploydirroot = deploydir + '/'
 
-        print('\nCleaning deploy dir: \'' + deploydir + '\'')
+        if self.link == 'hardlink':
+            # External tools can change staged files in place, which would
+            # write through a hardlink into the build tree or the Qt install
+            external = sorted(set(action.name for action in release.deploysteps if action.name in DeployCommand.external_steps))
+            if external:
+                raise Exception("--link hardlink can't be used with deploy steps that may change staged files in place: " + ', '.join(external) + ". Use --link reflink or copy instead.")
+
+        if self.clean_dry_run:
+            self.clean_dry_run_steps(release, releasedir, deploydirroot)
+            return
+
+        if self.incremental and os.path.isdir(deploydirroot):
+            print('\nUpdating deploy dir: \'' + deploydir + '\'')
+        else:
+            print('\nCleaning deploy dir: \'' + deploydir + '\'')
 
-        if (os.path.isdir(deploydir)):
-            shutil.rmtree(deploydir)
+            if (os.path.isdir(deploydir)):
+                with BuildTrace.span('clean deploy dir', 'deploy'):
+                    shutil.rmtree(deploydir)
 
-        print('Creating deploy dir: \'' + deploydirroot + '\'')
-        os.makedirs(deploydirroot)
+            print('Creating deploy dir: \'' + deploydirroot + '\'')
+            os.makedirs(deploydirroot)
 
-        print('\nExecuting deployment steps:')
-        for value in release.deploysteps:
-            print('\n *** ' + str(value).upper() + ' *** \n')
-            value(self.source_dir, releasedir, os.environ)
+        if not self.quiet:
+            print('\nExecuting deployment steps:')
+        runner = StepRunner(release, 'deploy', StepCache(releasedir), self.quiet, self.tail)
+        try:
+            runner(release.deploysteps, self.source_dir, releasedir, os.environ)
+        except StepError as e:
+            print('\nDeploy failed: ' + str(e.result))
+            sys.exit(1)
 
         if ( self.makedoc ):
             self.makedoc = os.path.abspath(self.makedoc)
 
             print('\n *** Creating documentation *** \n')
             doc_outpath = os.path.join(deploydir, release.document) if release.document else os.path.join(deploydir, releasename, 'doc')
-            os.makedirs(doc_outpath)
+            os.makedirs(doc_outpath, exist_ok=self.incremental)
             proc = Process.run(['node'] + [self.makedoc] + ['--output-path', doc_outpath] + [self.source_dir], os.path.dirname(self.makedoc), os.environ)
-            Process.trace('LIVEDOC: ', proc, end='')
+            exitcode = Process.trace('LIVEDOC: ', proc, end='')
+            if exitcode != 0:
+                print('\nDeploy failed: documentation generation exited with code ' + str(exitcode))
+                sys.exit(1)
 
         print('\nRemoving junk...')
 
@@ -140,6 +217,7 @@ class DeployCommand(Command):
 
         print(" * Archive Name: " + archive_name + "[" + archive_extension + "]")
         print(" * Archive Root dir: " + archive_root_dir)
-        shutil.make_archive(archive_name, archive_extension, archive_root_dir)
+        with BuildTrace.span('archive', 'deploy', { "format" : archive_extension }):
+            shutil.make_archive(archive_name, archive_extension, archive_root_dir)
 
         print("Done")
\ No newline at end of file
@@ -0,0 +1,88 @@
+import argparse
+
+from livepm.lib.command import Command
+from livepm.lib.buildstats import BuildStats
+
+class StatsCommand(Command):
+    name = 'stats'
+    description = 'Show step timings of previous builds and deployments'
+
+    def __init__(self):
+        pass
+
+    def parse_args(self, argv):
+        parser = argparse.ArgumentParser(description='Show step timings of previous builds and deployments, and flag steps that got slower.')
+        parser.add_argument('--package', '-p', default=None, help='Only show steps of this package.')
+        parser.add_argument('--release', '-r', default=None, help='Only show steps of this release id.')
+        parser.add_argument('--runs', '-n', type=int, default=10, help='Number of previous runs the last run of a step is compared with.')
+        parser.add_argument('--threshold', '-t', type=float, default=20, help='Percent over the median of the previous runs at which a step is flagged as regressed.')
+        parser.add_argument('--min-delta', type=float, default=1.0, help='Seconds a step must have slowed down by to be flagged, which keeps short steps from being flagged on noise.')
+        parser.add_argument('--store', default=None, help='Path to the step timing history. Defaults to $LIVEPM_STATS or ~/.livepm/stats.jsonl.')
+
+        args = parser.parse_args(argv)
+
+        self.package   = args.package
+        self.release   = args.release
+        self.runs      = max(1, args.runs)
+        self.threshold = args.threshold
+        self.min_delta = args.min_delta
+        self.stats     = BuildStats(args.store)
+
+    def __call__(self):
+        entries = self.stats.entries()
+
+        steps = {}
+        for entry in entries:
+            if entry.get('cached') or entry.get('exitcode') != 0:
+                continue
+            if self.package and entry['package'] != self.package:
+                continue
+            if self.release and entry['release'] != self.release:
+                continue
+            key = (entry['package'], entry['release'], entry['phase'], entry['step'], entry['type'])
+            steps.setdefault(key, []).append(entry)
+
+        if not steps:
+            print('No step timings recorded in \'' + self.stats.path + '\'')
+            return
+
+        print('Step timings from \'' + self.stats.path + '\'')
+
+        regressions = 0
+        current = None
+        for key in sorted(steps, key=lambda k: (k[0], k[1], k[2] != 'build', k[2], k[3])):
+            package, release, phase, step, steptype = key
+            if current != (package, release):
+                current = (package, release)
+                print('\n' + package + ' [' + release + ']')
+
+            history = sorted(steps[key], key=lambda e: e['time'])
+            last = history[-1]
+            previous = [e['duration'] for e in history[-self.runs - 1:-1]]
+            window = previous + [last['duration']]
+
+            line = '  ' + (phase + ':' + str(step)).ljust(10) + steptype.ljust(26)
+            line += ' runs ' + str(len(history)).rjust(4)
+            line += '  p50 ' + StatsCommand.seconds(BuildStats.percentile(window, 50))
+            line += '  p95 ' + StatsCommand.seconds(BuildStats.percentile(window, 95))
+            line += '  last ' + StatsCommand.seconds(last['duration'])
+            line += '  cpu ' + StatsCommand.seconds(last.get('cpu', 0) + last.get('child_cpu', 0))
+            if last.get('maxrss'):
+                line += '  rss ' + '{:.1f}'.format(last['maxrss'] / 1024) + 'MB'
+
+            if previous:
+                median = BuildStats.percentile(previous, 50)
+                delta = last['duration'] - median
+                if delta >= self.min_delta and last['duration'] > median * (1 + self.threshold / 100.0):
+                    regressions += 1
+                    change = '+{:.0f}%'.format(delta / median * 100) if median > 0 else '+' + StatsCommand.seconds(delta).strip()
+                    line += '  REGRESSED ' + change + ' vs median of previous ' + str(len(previous)) + ' runs'
+            print(line)
+
+        if regressions > 0:
+            print('\n' + str(regressions) + ' step(s) regressed by more than ' + '{:g}'.format(self.threshold) + '%.')
+        else:
+            print('\nNo regressions found.')
+
+    def seconds(value):
+        return ('{:.1f}'.format(value) + 's').rjust(8)
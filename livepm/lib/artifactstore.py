@@ -0,0 +1,256 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import re
+import threading
+import subprocess
+
+from livepm.lib.filelock import FileLock
+
+# Built release dirs shared between projects, keyed by everything they were
+# built from except where they were built. Entries are restored by
+# hardlinking, and evicted least recently used first. Restored dirs have no
+# build fingerprint, so a build from other inputs cleans them instead of
+# writing through the links. Entries keep the paths they were built with,
+# which relocate() rewrites for the dir they're restored to
+class ArtifactStore:
+    # Larger files are build products, not files with paths to rewrite
+    relocate_limit = 4 * 1024 * 1024
+    path_options = ['LIVEKEYS_BIN_PATH', 'LIVEKEYS_DEV_PATH']
+
+    def __init__(self, storedir, maxsize = 20 * 1024 * 1024 * 1024):
+        self.storedir = os.path.abspath(storedir)
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+
+    def default_dir():
+        return os.environ.get('LIVEPM_ARTIFACT_STORE')
+
+    def revision(sourcedir):
+        # The commit a dependency is checked out at, or None when its working
+        # tree has changes, in which case its outputs can't be shared
+        try:
+            head = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=sourcedir, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True)
+            status = subprocess.run(['git', 'status', '--porcelain'], cwd=sourcedir, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True)
+        except OSError:
+            return None
+        if head.returncode != 0 or status.returncode != 0 or status.stdout.strip():
+            return None
+        return head.stdout.strip()
+
+    def key(revision, release, options = [], upstream = []):
+        environment = {}
+        for key in sorted(release.environmentopt):
+            environment[key] = os.environ.get(key, '')
+
+        inputs = {
+            "revision" : revision,
+            "release" : release.to_json(),
+            "compiler" : release.compiler,
+            "environment" : environment,
+            "options" : options,
+            "upstream" : sorted(upstream)
+        }
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def portable_options(options):
+        # Paths of the workspace are left out of keys, and rewritten on restore
+        result = []
+        for option in options:
+            name = option.split('=', 1)[0]
+            result.append(name if name in ArtifactStore.path_options else option)
+        return result
+
+    def entry_path(self, key):
+        return os.path.join(self.storedir, 'entries', key)
+
+    def meta_path(self, key):
+        return os.path.join(self.storedir, 'entries', key + '.json')
+
+    def portable_dir(releasedir):
+        # Part of .livepm kept with the artifact: the paths it was built with,
+        # and the files its build deployed outside of its release dir
+        return os.path.join(releasedir, '.livepm', 'portable')
+
+    def copy_portable(releasedir, dst):
+        portable = ArtifactStore.portable_dir(releasedir)
+        if os.path.isdir(portable):
+            shutil.copytree(portable, ArtifactStore.portable_dir(dst), symlinks=True)
+
+    def set_origin(releasedir, paths):
+        path = os.path.join(ArtifactStore.portable_dir(releasedir), 'origin.json')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.lexists(path):
+            os.remove(path)
+        with open(path, 'w') as f:
+            json.dump(paths, f, indent=4)
+
+    def origin(releasedir):
+        try:
+            with open(os.path.join(ArtifactStore.portable_dir(releasedir), 'origin.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def relocate(releasedir, paths):
+        # Rewrites the paths an artifact was built with in the text files of
+        # its release dir, like config.pri and Makefiles. Files are replaced,
+        # never written to, since they may be hardlinks into the store
+        origin = ArtifactStore.origin(releasedir)
+        replacements = {}
+        for name, path in paths.items():
+            if origin.get(name) and path and origin[name] != path:
+                replacements[origin[name].encode('utf-8')] = path.encode('utf-8')
+
+        rewritten = 0
+        if replacements:
+            pattern = re.compile(b'|'.join(re.escape(old) for old in sorted(replacements, key=len, reverse=True)))
+            for root, dirs, files in os.walk(releasedir):
+                if root == releasedir and '.livepm' in dirs:
+                    dirs.remove('.livepm')
+                for name in files:
+                    filepath = os.path.join(root, name)
+                    if os.path.islink(filepath) or os.path.getsize(filepath) > ArtifactStore.relocate_limit:
+                        continue
+                    with open(filepath, 'rb') as f:
+                        data = f.read()
+                    if b'\0' in data[:8192] or pattern.search(data) is None:
+                        continue
+                    mode = os.stat(filepath).st_mode
+                    os.remove(filepath)
+                    with open(filepath, 'wb') as f:
+                        f.write(pattern.sub(lambda m: replacements[m.group(0)], data))
+                    os.chmod(filepath, mode)
+                    rewritten += 1
+
+        ArtifactStore.set_origin(releasedir, paths)
+        return rewritten
+
+    def marker_path(releasedir):
+        return os.path.join(releasedir, '.livepm', 'artifact.json')
+
+    def marker(releasedir):
+        try:
+            with open(ArtifactStore.marker_path(releasedir)) as f:
+                return json.load(f)['key']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def set_marker(releasedir, key):
+        path = ArtifactStore.marker_path(releasedir)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump({ "key" : key }, f, indent=4)
+
+    def filelock(self):
+        return FileLock(os.path.join(self.storedir, 'store.lock'))
+
+    def has(self, key):
+        return os.path.isdir(self.entry_path(key))
+
+    def restore(self, key, releasedir):
+        if ArtifactStore.marker(releasedir) == key and os.path.isdir(releasedir):
+            return True
+
+        with self.lock, self.filelock():
+            if not self.has(key):
+                return False
+            if os.path.isdir(releasedir):
+                shutil.rmtree(releasedir)
+            ArtifactStore.link_tree(self.entry_path(key), releasedir)
+            self.touch(key)
+
+        ArtifactStore.set_marker(releasedir, key)
+        return True
+
+    def put(self, key, releasedir):
+        if self.has(key):
+            with self.lock, self.filelock():
+                self.touch(key)
+            ArtifactStore.set_marker(releasedir, key)
+            return
+
+        # Entries are copied outside the lock and then moved in place, so other
+        # builds never see a partial entry
+        tmpdir = os.path.join(self.storedir, 'tmp', key + '-' + str(os.getpid()) + '-' + str(threading.get_ident()))
+        if os.path.isdir(tmpdir):
+            shutil.rmtree(tmpdir)
+        shutil.copytree(releasedir, tmpdir, symlinks=True, ignore=lambda d, names: ['.livepm'] if d == releasedir else [])
+        ArtifactStore.copy_portable(releasedir, tmpdir)
+        size = ArtifactStore.tree_size(tmpdir)
+
+        with self.lock, self.filelock():
+            if self.has(key):
+                shutil.rmtree(tmpdir)
+            else:
+                os.makedirs(os.path.dirname(self.entry_path(key)), exist_ok=True)
+                os.rename(tmpdir, self.entry_path(key))
+                with open(self.meta_path(key), 'w') as f:
+                    json.dump({ "size" : size, "used" : time.time() }, f)
+            self.evict(keep=key)
+
+        ArtifactStore.set_marker(releasedir, key)
+
+    def touch(self, key):
+        try:
+            with open(self.meta_path(key)) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = { "size" : ArtifactStore.tree_size(self.entry_path(key)) }
+        meta['used'] = time.time()
+        with open(self.meta_path(key), 'w') as f:
+            json.dump(meta, f)
+
+    def entries(self):
+        entries = []
+        entriesdir = os.path.join(self.storedir, 'entries')
+        if not os.path.isdir(entriesdir):
+            return entries
+        for name in os.listdir(entriesdir):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(entriesdir, name)) as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                continue
+            entries.append((meta.get('used', 0), meta.get('size', 0), name[:-5]))
+        return entries
+
+    def evict(self, keep = None):
+        # Must be called with the store locked
+        entries = sorted(self.entries())
+        total = sum(size for used, size, key in entries)
+        for used, size, key in entries:
+            if total <= self.maxsize:
+                break
+            if key == keep:
+                continue
+            print('Evicting artifact ' + key[:12] + ' (' + '{:.1f}'.format(size / (1024 * 1024)) + 'MB)')
+            shutil.rmtree(self.entry_path(key), ignore_errors=True)
+            os.remove(self.meta_path(key))
+            total -= size
+
+    def link_tree(src, dst):
+        for root, dirs, files in os.walk(src):
+            target = os.path.join(dst, os.path.relpath(root, src))
+            os.makedirs(target, exist_ok=True)
+            for name in dirs + files:
+                srcpath = os.path.join(root, name)
+                dstpath = os.path.join(target, name)
+                if os.path.islink(srcpath):
+                    os.symlink(os.readlink(srcpath), dstpath)
+                elif name in files:
+                    try:
+                        os.link(srcpath, dstpath)
+                    except OSError:
+                        shutil.copy2(srcpath, dstpath)
+
+    def tree_size(path):
+        size = 0
+        for root, dirs, files in os.walk(path):
+            for name in files:
+                size += os.lstat(os.path.join(root, name)).st_size
+        return size
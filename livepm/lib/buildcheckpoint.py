@@ -0,0 +1,35 @@
+import os
+import json
+import hashlib
+
+# Number of build steps completed in a build run, which is only trusted by a
+# resumed run with the same run id and release configuration
+class BuildCheckpoint:
+    def __init__(self, release, releasedir):
+        self.release = release
+        self.path = os.path.join(releasedir, '.livepm', 'checkpoint.json')
+
+    def key(self):
+        return hashlib.sha256(json.dumps(self.release.to_json(), sort_keys=True).encode('utf-8')).hexdigest()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('release') != self.key() or 'run' not in data or 'completed' not in data:
+            return None
+        return data
+
+    def completed(self, run):
+        data = self.load()
+        if data is None or data['run'] != run:
+            return None
+        return data['completed']
+
+    def save(self, run, completed):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + '.tmp', 'w') as f:
+            json.dump({ "run" : run, "release" : self.key(), "completed" : completed, "total" : len(self.release.buildsteps) }, f, indent=4)
+        os.replace(self.path + '.tmp', self.path)
@@ -1,14 +1,25 @@
 import sys
 import os
 import getopt
-import json
 import shutil
+import uuid
+import threading
+import concurrent.futures
 from livepm.lib.configuration import Configuration
 from livepm.lib.dependencytree import DependencyTree
+from livepm.lib.buildscheduler import BuildScheduler
+from livepm.lib.packageregistry import PackageRegistry
+from livepm.lib.buildfingerprint import BuildFingerprint
+from livepm.lib.steprunner import StepRunner
+from livepm.lib.stepcache import StepCache
+from livepm.lib.buildtrace import BuildTrace
+from livepm.lib.buildoutput import BuildOutput
+from livepm.lib.artifactstore import ArtifactStore
+from livepm.lib.buildcheckpoint import BuildCheckpoint
 
 class Builder:
 
-    def __init__(self, packagepath, releaseid):
+    def __init__(self, packagepath, releaseid, registry = None):
         self.packagefile = Configuration.findpackage(packagepath)
         self.releaseid = releaseid
         self.solve_dependencies = True
@@ -16,13 +27,26 @@ class Builder:
         self.livekeys_bin_path = None
         self.livekeys_dev_path = None
         self.dependencies = {}
+        self.jobs = 1
+        self.clean = False
+        self.quiet = False
+        self.cancelled = None
+        self.tail = 100
+        self.fetch_jobs = 8
+        self.artifacts = None
+        self.remote_cache = None
+        self.prebuilt_release = None
+        self.prebuilt = set()
+        self.partial = None
+        self.resume = False
+        self.run_id = None
+        self.artifact_keys = {}
+        self.deploy_lock = threading.Lock()
+        self.registry = registry if registry else PackageRegistry()
 
         print('\nParsing build file \'' + self.packagefile + '\'...')
 
-        with open(self.packagefile) as jsonfile:
-            packagejson = json.load(jsonfile)
-
-        self.config = Configuration(packagejson)
+        self.config = self.registry.load(self.packagefile)
         if ( not self.config.has_release(self.releaseid) ):
             raise Exception("Failed to find release id:" + self.releaseid)
 
@@ -30,53 +54,328 @@ class Builder:
 
         print('\nConfiguration found: ' + self.releaseid)
 
-    def create_dependency_tree(self, packagepath, sourcedir, builddir):
-        dependencies = {}
-        package_file = Configuration.findpackage(packagepath)
-        with open(package_file) as jsonfile:
-            packagejson = json.load(jsonfile)
+    def create_dependency_tree(self, packagepath, sourcedir, builddir, path = []):
+        tree = self.registry.tree(packagepath)
+        if tree is not None:
+            return tree
 
-        config = Configuration(packagejson)
-        if ( not self.config.has_release(self.releaseid) ):
-            raise Exception("Failed to find release id " + self.releaseid + " in " + package_file)
+        dependencies = {}
+        config = self.registry.load(packagepath)
+        if ( not config.has_release(self.releaseid) ):
+            raise Exception("Failed to find release id " + self.releaseid + " in " + Configuration.findpackage(packagepath))
 
         if ( len(config.dependencies) > 0 ):
             for depends in config.dependencies:
-                depends(sourcedir, builddir, self.releaseid)
-                dependencies[depends.name] = self.create_dependency_tree(depends.repodir, sourcedir, builddir)
-
-        # TODO: Check for dependency loops
-
+                if depends.name in self.prebuilt:
+                    continue
+                if depends.name in path:
+                    cycle = path[path.index(depends.name):] + [depends.name]
+                    raise Exception("Dependency cycle detected: " + ' -> '.join(cycle))
+                self.registry.resolve(depends, sourcedir, builddir, self.releaseid)
+                dependencies[depends.name] = self.create_dependency_tree(depends.repodir, sourcedir, builddir, path + [depends.name])
+
+        self.registry.set_tree(packagepath, dependencies)
         return dependencies
 
-    def __call__(self, sourcedir, builddir, options = {}):
-
-        sourcedir = os.path.abspath(sourcedir)
+    def fetch_dependencies(self, sourcedir, builddir):
+        # Clones every dependency of the tree before the tree is walked. A
+        # dependency's own dependencies are queued as soon as it is cloned, so
+        # the clones of independent branches of the tree run concurrently
+        queued = set()
+        running = {}
+        failure = None
+
+        output = BuildOutput.install()
+        prefix = output.prefix()
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.fetch_jobs) as executor:
+                pending = list(self.config.dependencies)
+                while pending or running:
+                    for depends in pending:
+                        if depends.name not in queued and depends.name not in self.prebuilt and failure is None:
+                            queued.add(depends.name)
+                            running[executor.submit(self.fetch_dependency, output, prefix, depends, sourcedir, builddir)] = depends
+                    pending = []
+
+                    if not running:
+                        break
+
+                    done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        running.pop(future)
+                        try:
+                            pending.extend(future.result())
+                        except BaseException as e:
+                            if failure is None:
+                                failure = e
+        finally:
+            BuildOutput.uninstall()
+
+        if failure is not None:
+            raise failure
+
+    def fetch_dependency(self, output, prefix, depends, sourcedir, builddir):
+        output.set_prefix(prefix + '[' + depends.name + '] ')
+        try:
+            self.registry.resolve(depends, sourcedir, builddir, self.releaseid)
+            return self.registry.load(depends.repodir).dependencies
+        finally:
+            output.set_prefix(None)
+
+    def install_prebuilt(self, builddir):
+        # Installs the -dev releases of the package's dependencies concurrently.
+        # Dependencies without one are left to be built from source
+        output = BuildOutput.install()
+        prefix = output.prefix()
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.fetch_jobs) as executor:
+                futures = {}
+                for depends in self.config.dependencies:
+                    futures[depends.name] = executor.submit(self.install_prebuilt_dependency, output, prefix, depends, os.path.join(builddir, depends.name))
+                for name, future in futures.items():
+                    if future.result():
+                        self.prebuilt.add(name)
+        finally:
+            BuildOutput.uninstall()
+
+        if 'livekeys' in self.prebuilt:
+            self.set_livekeys_paths(os.path.join(builddir, 'livekeys'), os.path.join(builddir, 'livekeys'))
+
+    def install_prebuilt_dependency(self, output, prefix, depends, releasedir):
+        output.set_prefix(prefix + '[' + depends.name + '] ')
+        try:
+            with BuildTrace.span('prebuilt ' + depends.name, 'dependency', { "package" : depends.name }):
+                return self.prebuilt_release(depends, releasedir)
+        finally:
+            output.set_prefix(None)
+
+    def set_livekeys_paths(self, releasedir, devpath):
+        livekeys_bin_path = os.path.join(releasedir, "bin")
+        if sys.platform.lower() == 'darwin':
+            livekeys_bin_path = os.path.join(livekeys_bin_path, "livekeys.app", "Contents")
+        self.livekeys_bin_path = livekeys_bin_path
+        self.livekeys_dev_path = devpath
+
+    def upstream(self, name, graph):
+        found = set()
+        stack = list(graph[name])
+        while stack:
+            depends = stack.pop()
+            if depends not in found:
+                found.add(depends)
+                stack.extend(graph[depends])
+        return found
+
+    def build_dependency(self, name, graph, sourcedir, builddir, options, cancelled = None):
+        dependency_source = os.path.join(sourcedir, "dependencies", name)
+        dependency_release = os.path.join(builddir, name)
+
+        b = Builder(dependency_source, self.releaseid, self.registry)
+        b.solve_dependencies = False
+        b.cancelled = cancelled
+        b.clean = self.clean
+        b.quiet = self.quiet
+        b.tail = self.tail
+        b.resume = self.resume
+        b.run_id = self.run_id
+
+        # Livekeys paths are only handed to builds that depend on livekeys, since
+        # those are the only ones guaranteed to run after it completed. A prebuilt
+        # livekeys is in place before any dependency is built
+        if 'livekeys' in self.prebuilt or 'livekeys' in self.upstream(name, graph):
+            b.livekeys_bin_path = self.livekeys_bin_path
+            b.livekeys_dev_path = self.livekeys_dev_path
+
+        b.releasedir = dependency_release
+
+        key = self.artifact_key(name, graph, dependency_source, b)
+        paths = {
+            "build" : builddir,
+            "dependencies" : os.path.join(sourcedir, "dependencies"),
+            "livekeys_bin" : b.livekeys_bin_path,
+            "livekeys_dev" : b.livekeys_dev_path
+        }
+        deploys = key is not None and b.deploy_to_livekeys and b.livekeys_bin_path
+        if key is not None and ArtifactStore.marker(dependency_release) == key:
+            print('\nRelease dir of \'' + name + '\' matches artifact: ' + key[:12])
+            if deploys:
+                Builder.install_deployed(dependency_release, b.livekeys_bin_path)
+        elif key is not None and self.artifacts and self.artifacts.restore(key, dependency_release):
+            print('\nRestored \'' + name + '\' from artifact store: ' + key[:12])
+            Builder.restored(dependency_release, paths, b.livekeys_bin_path if deploys else None)
+        elif key is not None and self.remote_cache and self.remote_cache.get(key, dependency_release):
+            print('\nRestored \'' + name + '\' from remote cache: ' + key[:12])
+            Builder.restored(dependency_release, paths, b.livekeys_bin_path if deploys else None)
+            if self.artifacts:
+                self.artifacts.put(key, dependency_release)
+            else:
+                ArtifactStore.set_marker(dependency_release, key)
+        else:
+            if deploys:
+                # Builds deploying into livekeys run one at a time while they're
+                # stored, so the files each of them deployed can be told apart
+                with self.deploy_lock:
+                    before = Builder.snapshot(b.livekeys_bin_path)
+                    b(dependency_source, dependency_release, options)
+                    Builder.keep_deployed(dependency_release, b.livekeys_bin_path, before)
+            else:
+                b(dependency_source, dependency_release, options)
+            if key is not None:
+                ArtifactStore.set_origin(dependency_release, paths)
+            if key is not None and self.artifacts:
+                self.artifacts.put(key, dependency_release)
+                print('\nStored \'' + name + '\' in artifact store: ' + key[:12])
+            if key is not None and self.remote_cache:
+                self.remote_cache.put(key, dependency_release)
+        self.artifact_keys[name] = key
+
+        if name == 'livekeys':
+            self.set_livekeys_paths(dependency_release, dependency_source)
+
+    def snapshot(path):
+        files = {}
+        for root, dirs, names in os.walk(path):
+            for name in names:
+                filepath = os.path.join(root, name)
+                st = os.lstat(filepath)
+                files[os.path.relpath(filepath, path)] = (st.st_size, st.st_mtime_ns)
+        return files
+
+    def keep_deployed(releasedir, livekeys_bin_path, before):
+        # Keeps the files the build added or changed in livekeys with the
+        # release dir, so restoring it can deploy them again
+        deployed = os.path.join(ArtifactStore.portable_dir(releasedir), 'livekeys')
+        if os.path.isdir(deployed):
+            shutil.rmtree(deployed)
+        for relpath, stamp in Builder.snapshot(livekeys_bin_path).items():
+            if before.get(relpath) != stamp:
+                os.makedirs(os.path.dirname(os.path.join(deployed, relpath)), exist_ok=True)
+                shutil.copy2(os.path.join(livekeys_bin_path, relpath), os.path.join(deployed, relpath), follow_symlinks=False)
+
+    def install_deployed(releasedir, livekeys_bin_path):
+        deployed = os.path.join(ArtifactStore.portable_dir(releasedir), 'livekeys')
+        installed = Builder.snapshot(livekeys_bin_path)
+        for relpath, stamp in Builder.snapshot(deployed).items():
+            if installed.get(relpath) == stamp:
+                continue
+            target = os.path.join(livekeys_bin_path, relpath)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            if os.path.lexists(target):
+                os.remove(target)
+            shutil.copy2(os.path.join(deployed, relpath), target, follow_symlinks=False)
+
+    def restored(releasedir, paths, livekeys_bin_path):
+        rewritten = ArtifactStore.relocate(releasedir, paths)
+        if rewritten:
+            print('Rewrote paths of ' + str(rewritten) + ' files for \'' + releasedir + '\'')
+        if livekeys_bin_path:
+            Builder.install_deployed(releasedir, livekeys_bin_path)
+
+    def skip_dependency(self, name, sourcedir, builddir):
+        dependency_release = os.path.join(builddir, name)
+        if os.path.isdir(dependency_release):
+            print('\nSkipping \'' + name + '\', using release dir: \'' + dependency_release + '\'')
+        else:
+            print('\nSkipping \'' + name + '\', which has not been built yet: \'' + dependency_release + '\'')
+
+        if name == 'livekeys':
+            self.set_livekeys_paths(dependency_release, os.path.join(sourcedir, 'dependencies', name))
+
+    def select(self, graph):
+        # Names of the packages a partial build runs, or None when the whole
+        # tree is built. The package itself is the root of the tree
+        if self.partial is None:
+            return None
+        mode, target = self.partial
+        root = self.config.name
+        tree = dict(graph)
+        tree[root] = [depends.name for depends in self.config.dependencies if depends.name in graph]
+        if target not in tree:
+            raise Exception("Failed to find dependency \'" + target + "\' in the dependency tree of " + root)
+
+        selected = set([target])
+        if mode == 'upstream':
+            selected |= self.upstream(target, tree)
+        elif mode == 'downstream':
+            selected |= set(name for name in tree if target in self.upstream(name, tree))
+        return selected
+
+    def artifact_key(self, name, graph, dependency_source, b):
+        # Dependencies can only be shared when they are built from a clean
+        # checkout against dependencies that could be shared as well
+        if self.artifacts is None and self.remote_cache is None:
+            return None
+        upstream = []
+        for depends in self.upstream(name, graph):
+            if self.artifact_keys.get(depends) is None:
+                return None
+            upstream.append(self.artifact_keys[depends])
+        revision = ArtifactStore.revision(dependency_source)
+        if revision is None:
+            print('\nNot using artifact store for \'' + name + '\': source is not a clean checkout')
+            return None
+        return ArtifactStore.key(revision, b.release, ArtifactStore.portable_options(b.config_options()), upstream)
 
-        print('  Modules:')
-        for key, value in self.config.components.items():
-            print('   * ' + str(value))
+    def __call__(self, sourcedir, builddir, options = {}):
+        with BuildTrace.span('build ' + self.config.name, 'builder', { "package" : self.config.name, "release" : self.releaseid }):
+            self.build(sourcedir, builddir, options)
 
-        print('  Dependencies:')
-        for value in self.config.dependencies:
-            print('   * ' + str(value))
+    def build(self, sourcedir, builddir, options = {}):
 
-        print('  Source dir: \'' + sourcedir + '\'')
-        print('  Release dir: \'' + builddir + '\'')
-        print('  Compiler: \'' + self.release.compiler + '\'')
+        sourcedir = os.path.abspath(sourcedir)
 
         self.release.init_environment()
-        print('  Environment:')
-        for key, value in self.release.environment.items():
-            print('   * ' + key + ':\'' + os.environ[key] + '\'')
 
-        print('\nCleaning release dir: \'' + builddir + '\'')
-        if ( os.path.isdir(builddir) ):
-            shutil.rmtree(builddir)
-        os.makedirs(builddir)
-
-        if ( len(self.config.dependencies) > 0 and self.solve_dependencies ):
+        if not self.quiet:
+            print('  Modules:')
+            for key, value in self.config.components.items():
+                print('   * ' + str(value))
+
+            print('  Dependencies:')
+            for value in self.config.dependencies:
+                print('   * ' + str(value))
+
+            print('  Source dir: \'' + sourcedir + '\'')
+            print('  Release dir: \'' + builddir + '\'')
+            print('  Compiler: \'' + self.release.compiler + '\'')
+
+            print('  Environment:')
+            for key, value in self.release.environment.items():
+                print('   * ' + key + ':\'' + os.environ[key] + '\'')
+
+        if self.clean and self.partial is None:
+            print('\nCleaning release dir: \'' + builddir + '\'')
+            if ( os.path.isdir(builddir) ):
+                shutil.rmtree(builddir)
+            os.makedirs(builddir)
+        elif not os.path.isdir(builddir):
+            os.makedirs(builddir)
+
+        # Every package built in this run records its progress under the run id
+        # of the root package, which --resume picks up from its checkpoint
+        checkpoint = BuildCheckpoint(self.release, builddir)
+        if self.run_id is None:
+            data = checkpoint.load() if self.resume else None
+            if data is not None:
+                self.run_id = data['run']
+                print('\nResuming build run ' + self.run_id[:12] + ' (' + str(data['completed']) + '/' + str(data['total']) + ' build steps completed)')
+            else:
+                if self.resume:
+                    print('\nNo valid checkpoint found in \'' + builddir + '\', building from the start')
+                self.run_id = uuid.uuid4().hex
+                checkpoint.save(self.run_id, 0)
+
+        dependency_names = []
+        selected = None
+
+        if ( len(self.config.dependencies) > 0 and self.solve_dependencies and self.prebuilt_release ):
+            print('\nInstalling prebuilt dependencies:')
+            self.install_prebuilt(builddir)
+            dependency_names = sorted(self.prebuilt)
+
+        if ( len(self.config.dependencies) > len(self.prebuilt) and self.solve_dependencies ):
             print('\nSolving dependencies:')
+            self.fetch_dependencies(sourcedir, builddir)
             dependency_tree = self.create_dependency_tree(sourcedir, sourcedir, builddir)
             print('Dependency Tree: ' + str(dependency_tree))
 
@@ -85,33 +384,99 @@ class Builder:
             builds = dt.build_order()
 
             print('Build order: ' + str(builds))
+            if self.jobs > 1:
+                print('Building with ' + str(self.jobs) + ' parallel jobs')
+
+            graph = dt.dependencies()
+            dependency_names += list(graph)
+
+            selected = self.select(graph)
+            if selected is not None:
+                print('Partial build of: ' + str([name for name in builds + [self.config.name] if name in selected]))
+
+            scheduler = BuildScheduler(graph, builds, self.jobs)
+            if self.cancelled is not None:
+                scheduler.cancelled = self.cancelled
+            scheduler(lambda name:
+                self.build_dependency(name, graph, sourcedir, builddir, options, scheduler.cancelled)
+                if selected is None or name in selected else self.skip_dependency(name, sourcedir, builddir))
+
+        if selected is None and self.solve_dependencies:
+            selected = self.select({})
+        if selected is not None and self.config.name not in selected:
+            print('\nSkipping build steps of \'' + self.config.name + '\'')
+            return
+
+        resume_from = checkpoint.completed(self.run_id) if self.resume else None
+        if resume_from is not None and resume_from >= len(self.release.buildsteps):
+            print('\nBuild steps of \'' + self.config.name + '\' completed in a previous run, skipping')
+            return
+
+        options = self.config_options()
+
+        # Build dirs of other releases usually sit next to this one inside the source tree
+        buildroot = os.path.dirname(builddir)
+        if buildroot == sourcedir or not buildroot.startswith(sourcedir + os.sep):
+            buildroot = builddir
+
+        fingerprint = BuildFingerprint(self.release, sourcedir, options, [
+            buildroot,
+            os.path.join(sourcedir, 'dependencies')
+        ])
+        if self.clean and self.partial is not None:
+            # Partial builds only clean what they build, and keep the release
+            # dirs of dependencies nested inside this one
+            print('\nCleaning release dir: \'' + builddir + '\'')
+            Builder.clean_release_dir(builddir, dependency_names)
+        elif resume_from is not None:
+            print('\nResuming release dir at build step ' + str(resume_from) + ': \'' + builddir + '\'')
+        elif not self.clean:
+            # Release dirs without a fingerprint are new, or restored from an
+            # artifact, which is cleaned rather than built over
+            matches = fingerprint.matches(builddir)
+            if matches is None:
+                Builder.clean_release_dir(builddir, dependency_names)
+            elif not matches:
+                print('\nBuild configuration changed, cleaning release dir: \'' + builddir + '\'')
+                Builder.clean_release_dir(builddir, dependency_names)
+            elif fingerprint.source_matches(builddir):
+                print('\nRelease dir is up to date with its inputs, building incrementally: \'' + builddir + '\'')
+            else:
+                print('\nSources changed, building incrementally: \'' + builddir + '\'')
+        if resume_from is None:
+            checkpoint.save(self.run_id, 0)
+
+        # The configuration is written to the release dir, which leaves the
+        # source tree untouched and lets several releases build from it at once
+        configpath = os.path.join(builddir, 'config.pri')
+        if not self.quiet:
+            print('\nCreating config file: \'' + configpath + '\'')
 
-            for dependency_build in builds:
-                dependency_source = os.path.join(sourcedir, "dependencies", dependency_build)
-                dependency_release = os.path.join(builddir, dependency_build)
-
-                b = Builder(dependency_source, self.releaseid)
-                b.solve_dependencies = False
+        writedata = ''
+        for t in options:
+            writedata += t + '\n'
 
-                if self.livekeys_bin_path:
-                    value.options.append("LIVEKEYS_BIN_PATH=\'" + self.livekeys_bin_path + "\'")
-                if self.livekeys_dev_path:
-                    value.options.append("LIVEKEYS_DEV_PATH=\'" + self.livekeys_dev_path + "\'")
+        f = open(configpath, 'w')
+        f.write(writedata)
+        f.close()
 
-                b.releasedir = dependency_release
-                b(dependency_source, dependency_release, options)
+        if not self.quiet:
+            print('\nExecuting build steps:')
 
-                if dependency_build == 'livekeys':
-                    self.livekeys_bin_path = os.path.join(dependency_release, "bin")
-                    if sys.platform.lower() == 'darwin':
-                        self.livekeys_bin_path = os.path.join(self.livekeys_bin_path, "livekeys.app", "Contents")
-                    self.livekeys_dev_path = dependency_source
+        # Sources are hashed before they're built, so edits made during the
+        # build are seen by the next one
+        fingerprint.source()
 
-        print('\nCreating config file:')
+        runner = StepRunner(self.release, 'build', StepCache(builddir), self.quiet, self.tail)
+        runner.cancelled = self.cancelled
+        runner.checkpoint = checkpoint
+        runner.run_id = self.run_id
+        runner.start = resume_from if resume_from is not None else 0
+        runner(self.release.buildsteps, sourcedir, builddir, os.environ)
 
-        if ( os.path.exists(sourcedir + '/config.pri') ):
-            os.rename(sourcedir + '/config.pri', sourcedir + '/config.pri.bak')
+        fingerprint.save(builddir)
 
+    def config_options(self):
         options = ["BUILD_DEPENDENCIES=false"]
         if self.livekeys_bin_path:
             options.append("LIVEKEYS_BIN_PATH=\'" + self.livekeys_bin_path + "\'")
@@ -122,25 +487,16 @@ class Builder:
         else:
             options.append("DEPLOY_TO_LIVEKEYS=false")
 
-        writedata = ''
-        for t in options:
-            writedata += t + '\n'
-
-        f = open(sourcedir + '/config.pri', 'w')
-        f.write(writedata)
-        f.close()
-
-        print('\nExecuting build steps:')
-
-        for value in self.release.buildsteps:
-            print('\n *** ' + str(value) + ' *** \n')
-
-            value(sourcedir, builddir, os.environ)
-
-        print('\nRemoving config file')
-
-        os.remove(sourcedir + '/config.pri')
-        if ( os.path.exists(sourcedir + '/config.pri.bak') ):
-            os.rename(sourcedir + '/config.pri.bak', sourcedir + '/config.pri')
-
-
+        return options
+
+    def clean_release_dir(builddir, keep = []):
+        # Removes the outputs of a release, but keeps the release dirs of its
+        # dependencies, which are nested inside it
+        for entry in os.listdir(builddir):
+            if entry in keep:
+                continue
+            path = os.path.join(builddir, entry)
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
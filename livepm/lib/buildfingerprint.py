@@ -0,0 +1,67 @@
+import os
+import json
+import hashlib
+
+from livepm.lib.filesystem import FileSystem
+
+# Hashes of the inputs a release dir was built from. The dir only needs
+# cleaning when the configuration changes, while changed sources are rebuilt
+# incrementally
+class BuildFingerprint:
+    def __init__(self, release, sourcedir, options = [], exclude = []):
+        self.release = release
+        self.sourcedir = sourcedir
+        self.options = options
+        self.exclude = exclude
+        self.value = None
+        self.source_value = None
+
+    def compute(self):
+        if self.value is None:
+            environment = {}
+            for key in sorted(self.release.environment):
+                environment[key] = os.environ.get(key, '')
+
+            inputs = {
+                "release" : self.release.to_json(),
+                "environment" : environment,
+                "compiler" : self.release.compiler,
+                "options" : self.options
+            }
+            self.value = hashlib.sha256(json.dumps(inputs, sort_keys=True).encode('utf-8')).hexdigest()
+        return self.value
+
+    def source(self):
+        if self.source_value is None:
+            self.source_value = FileSystem.hashTree(self.sourcedir, self.exclude)
+        return self.source_value
+
+    def path(releasedir):
+        return os.path.join(releasedir, '.livepm', 'fingerprint.json')
+
+    def stored(releasedir):
+        try:
+            with open(BuildFingerprint.path(releasedir)) as f:
+                data = json.load(f)
+            return { "fingerprint" : data['fingerprint'], "source" : data.get('source') }
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def matches(self, releasedir):
+        # None when the release dir has no fingerprint, else whether it was
+        # built with the same configuration
+        stored = BuildFingerprint.stored(releasedir)
+        if stored is None:
+            return None
+        return stored['fingerprint'] == self.compute()
+
+    def source_matches(self, releasedir):
+        stored = BuildFingerprint.stored(releasedir)
+        return stored is not None and stored['source'] == self.source()
+
+    def save(self, releasedir):
+        path = BuildFingerprint.path(releasedir)
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            json.dump({ "fingerprint" : self.compute(), "source" : self.source(), "release" : self.release.id }, f, indent=4)
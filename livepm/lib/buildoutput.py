@@ -0,0 +1,79 @@
+import sys
+import threading
+
+# Stands in for sys.stdout while builds run on several threads, writing only
+# complete lines so they never interleave. Threads can set a prefix, or
+# capture their output into a sink in quiet mode
+class BuildOutput:
+    installed = 0
+    guard = threading.Lock()
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def capture(self, sink):
+        self.local.sink = sink
+
+    def release(self):
+        self.local.sink = None
+
+    def prefix(self):
+        return getattr(self.local, 'prefix', None) or ''
+
+    def set_prefix(self, prefix):
+        self.flush_thread()
+        self.local.prefix = prefix
+        self.local.pending = ''
+
+    def write(self, text):
+        sink = getattr(self.local, 'sink', None)
+        if sink is not None:
+            return sink.write(text)
+
+        prefix = getattr(self.local, 'prefix', None)
+        if prefix is None:
+            with self.lock:
+                return self.stream.write(text)
+
+        data = self.local.pending + text
+        lastnewline = data.rfind('\n')
+        if lastnewline == -1:
+            self.local.pending = data
+            return len(text)
+
+        self.local.pending = data[lastnewline + 1:]
+        lines = data[:lastnewline].split('\n')
+        with self.lock:
+            self.stream.write(''.join(prefix + line + '\n' for line in lines))
+        return len(text)
+
+    def flush_thread(self):
+        pending = getattr(self.local, 'pending', '')
+        if pending:
+            self.local.pending = ''
+            with self.lock:
+                self.stream.write(self.local.prefix + pending + '\n')
+
+    def flush(self):
+        with self.lock:
+            self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+    def install():
+        with BuildOutput.guard:
+            BuildOutput.installed += 1
+            if not isinstance(sys.stdout, BuildOutput):
+                sys.stdout = BuildOutput(sys.stdout)
+            return sys.stdout
+
+    def uninstall():
+        with BuildOutput.guard:
+            BuildOutput.installed = max(0, BuildOutput.installed - 1)
+            if isinstance(sys.stdout, BuildOutput):
+                sys.stdout.flush_thread()
+                if BuildOutput.installed == 0:
+                    sys.stdout = sys.stdout.stream
@@ -0,0 +1,75 @@
+import threading
+import concurrent.futures
+
+from livepm.lib.buildoutput import BuildOutput
+from livepm.lib.process import Process
+
+# Starts a node once all its dependencies finished, up to 'jobs' at once. The
+# first failure stops new nodes and terminates the running ones
+class BuildScheduler:
+    def __init__(self, graph, order, jobs = 1):
+        self.graph = graph
+        self.order = order
+        self.jobs = max(1, jobs)
+        self.cancelled = threading.Event()
+
+    def __call__(self, build):
+        if self.jobs == 1:
+            for name in self.order:
+                build(name)
+            return
+
+        position = {name: index for index, name in enumerate(self.order)}
+        remaining = {name: set(depends) for name, depends in self.graph.items()}
+        dependents = {name: [] for name in self.graph}
+        for name, depends in self.graph.items():
+            for depend in depends:
+                dependents[depend].append(name)
+
+        ready = sorted([name for name, depends in remaining.items() if len(depends) == 0], key=lambda n: position[n])
+        running = {}
+        failure = None
+
+        output = BuildOutput.install()
+        # Schedulers can be nested, in which case the prefix of the enclosing
+        # build is kept in front of the node names
+        prefix = output.prefix()
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.jobs) as executor:
+                while ready or running:
+                    while ready and len(running) < self.jobs and failure is None:
+                        name = ready.pop(0)
+                        running[executor.submit(self._run, output, prefix, build, name)] = name
+
+                    if not running:
+                        break
+
+                    done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        name = running.pop(future)
+                        error = future.exception()
+                        if error is not None:
+                            if failure is None:
+                                failure = error
+                                self.cancelled.set()
+                                print('Build failed for \'' + name + '\', cancelling remaining builds.')
+                                Process.terminate_all()
+                            continue
+
+                        for dependent in dependents[name]:
+                            remaining[dependent].discard(name)
+                            if len(remaining[dependent]) == 0:
+                                ready.append(dependent)
+                    ready.sort(key=lambda n: position[n])
+        finally:
+            BuildOutput.uninstall()
+
+        if failure is not None:
+            raise failure
+
+    def _run(self, output, prefix, build, name):
+        output.set_prefix(prefix + '[' + name + '] ')
+        try:
+            return build(name)
+        finally:
+            output.set_prefix(None)
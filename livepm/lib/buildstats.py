@@ -0,0 +1,67 @@
+import os
+import math
+import json
+import time
+import threading
+
+# Step history as JSON lines, in ~/.livepm/stats.jsonl or $LIVEPM_STATS
+class BuildStats:
+    lock = threading.Lock()
+
+    def __init__(self, path = None):
+        self.path = path if path else BuildStats.default_path()
+
+    def default_path():
+        if 'LIVEPM_STATS' in os.environ:
+            return os.environ['LIVEPM_STATS']
+        return os.path.join(os.path.expanduser('~'), '.livepm', 'stats.jsonl')
+
+    def entry(release, phase, result):
+        return {
+            "time" : round(time.time(), 3),
+            "package" : release.name,
+            "release" : release.id,
+            "phase" : phase,
+            "step" : int(result.name.split(':')[-1]),
+            "type" : result.action.name,
+            "duration" : round(result.duration, 3),
+            "cpu" : round(result.cpu, 3),
+            "child_cpu" : round(result.child_cpu, 3),
+            "maxrss" : result.maxrss,
+            "exitcode" : result.exitcode,
+            "cached" : result.cached
+        }
+
+    def record(self, release, phase, results):
+        if not results:
+            return
+        data = ''.join(json.dumps(BuildStats.entry(release, phase, result), sort_keys=True) + '\n' for result in results)
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            # A single append per run keeps lines from concurrent builds whole
+            with BuildStats.lock:
+                with open(self.path, 'a') as f:
+                    f.write(data)
+        except OSError as e:
+            print('Failed to record step timings to \'' + self.path + '\': ' + str(e))
+
+    def entries(self):
+        entries = []
+        if not os.path.exists(self.path):
+            return entries
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # Lines cut short by an interrupted write are skipped
+                    continue
+        return entries
+
+    def percentile(values, percent):
+        # Nearest rank percentile
+        if not values:
+            return None
+        ordered = sorted(values)
+        index = min(len(ordered), max(1, math.ceil(percent / 100.0 * len(ordered)))) - 1
+        return ordered[index]
@@ -0,0 +1,92 @@
+import os
+import json
+import time
+import threading
+
+class BuildTraceSpan:
+    def __init__(self, trace, name, category, args):
+        self.trace = trace
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        if self.trace is not None:
+            self.start = self.trace.now()
+            self.trace.push_context(self.args)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.trace is not None:
+            args = self.trace.pop_context()
+            if exc_type is not None:
+                args['error'] = exc_type.__name__ + ': ' + str(exc)
+            self.trace.add(self.name, self.category, self.start, self.trace.now() - self.start, args)
+        return False
+
+
+# Trace Event Format spans, for chrome://tracing or Perfetto. Spans inherit
+# the arguments of enclosing spans on the same thread
+class BuildTrace:
+    active = None
+
+    def __init__(self):
+        self.events = []
+        self.lock = threading.Lock()
+        self.origin = time.perf_counter()
+        self.pid = os.getpid()
+        self.threads = {}
+        self.local = threading.local()
+
+    def now(self):
+        return (time.perf_counter() - self.origin) * 1000000
+
+    def thread_id(self):
+        ident = threading.get_ident()
+        with self.lock:
+            if ident not in self.threads:
+                self.threads[ident] = len(self.threads) + 1
+                self.events.append({
+                    "name" : "thread_name", "ph" : "M", "pid" : self.pid, "tid" : self.threads[ident],
+                    "args" : { "name" : threading.current_thread().name }
+                })
+            return self.threads[ident]
+
+    def push_context(self, args):
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        context = dict(stack[-1]) if stack else {}
+        context.update(args)
+        stack.append(context)
+
+    def pop_context(self):
+        return dict(self.local.stack.pop())
+
+    def add(self, name, category, start, duration, args):
+        tid = self.thread_id()
+        with self.lock:
+            self.events.append({
+                "name" : name, "cat" : category, "ph" : "X", "pid" : self.pid, "tid" : tid,
+                "ts" : round(start, 3), "dur" : round(duration, 3), "args" : args
+            })
+
+    def save(self, path):
+        with self.lock:
+            data = { "traceEvents" : list(self.events), "displayTimeUnit" : "ms" }
+        with open(path, 'w') as f:
+            json.dump(data, f)
+
+    def span(name, category, args = {}):
+        return BuildTraceSpan(BuildTrace.active, name, category, args)
+
+    def start():
+        BuildTrace.active = BuildTrace()
+        return BuildTrace.active
+
+    def stop(path):
+        trace = BuildTrace.active
+        BuildTrace.active = None
+        if trace is not None:
+            trace.save(path)
+            print('Trace written to: ' + path)
@@ -0,0 +1,230 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import concurrent.futures
+
+from livepm.lib.filesystem import FileSystem
+
+# Copies a flat plan of files in parallel, with copy_file_range where
+# available. With a manifest, unchanged files are skipped and files the
+# previous run copied that are no longer planned are removed
+class CopyEngine:
+    # Strategy used by engines created without one, set by deploy --link
+    strategy = 'copy'
+
+    def __init__(self, jobs = None, manifest = None, strategy = None):
+        self.jobs = jobs if jobs else min(32, (os.cpu_count() or 1) * 4)
+        self.manifest = manifest
+        self.strategy = strategy if strategy else CopyEngine.strategy
+        if self.strategy not in FileSystem.link_strategies:
+            raise Exception("Unknown link strategy: " + self.strategy)
+        self.previous = { "files" : {}, "links" : {}, "dirs" : [] }
+        self.files = {}
+        self.links = {}
+        self.dirs = {}
+
+        if manifest:
+            try:
+                with open(manifest) as f:
+                    self.previous.update(json.load(f))
+            except (OSError, ValueError):
+                pass
+
+    def add_structure(self, releaseDir, structure, structurePaths):
+        for src, dst in FileSystem.structureEntries(releaseDir, structure, structurePaths):
+            self.add(src, dst)
+
+    def add(self, src, dst):
+        targets = FileSystem.copyTargets(src, dst)
+        if len(targets) == 0 and FileSystem.isPattern(src):
+            print('Warning: No files copied for pattern: ' + src)
+
+        for src, dst in targets:
+            if os.path.isdir(src):
+                self.add_tree(src, dst)
+            elif os.path.islink(src):
+                self.add_link(os.readlink(src), dst)
+            elif os.path.exists(src):
+                self.add_file(src, dst, False)
+            else:
+                raise Exception("Copy source does not exist: " + src)
+
+    def add_tree(self, src, dst):
+        if os.path.exists(dst) and dst not in self.dirs and dst not in self.previous['dirs']:
+            raise Exception("Copy destination already exists: " + dst)
+        # Follows symlinks, like shutil.copytree does by default
+        for root, dirs, files in os.walk(src, followlinks=True):
+            target = os.path.join(dst, os.path.relpath(root, src)) if root != src else dst
+            self.dirs[target] = root
+            for name in files:
+                self.add_file(os.path.join(root, name), os.path.join(target, name), True)
+
+    def add_file(self, src, dst, metadata):
+        self.links.pop(dst, None)
+        self.files[dst] = (src, metadata)
+
+    def add_link(self, linkto, dst):
+        self.files.pop(dst, None)
+        self.links[dst] = linkto
+
+    def copy_file_range(src, dst):
+        # Returns False when the kernel can't copy between these files, before
+        # any data was written
+        if not hasattr(os, 'copy_file_range'):
+            return False
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            size = os.fstat(fsrc.fileno()).st_size
+            if size == 0:
+                # Empty, or a procfs or sysfs file whose size isn't known,
+                # which shutil reads until its end
+                return False
+            offset = 0
+            while offset < size:
+                try:
+                    copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), size - offset)
+                except OSError:
+                    if offset == 0:
+                        return False
+                    raise
+                if copied == 0:
+                    # Some filesystems report no data instead of failing,
+                    # and a short copy must never pass as a complete one
+                    if offset == 0:
+                        return False
+                    raise OSError("Copy of \'" + src + "\' ended after " + str(offset) + " of " + str(size) + " bytes")
+                offset += copied
+        return True
+
+    def copy(src, dst, metadata, strategy):
+        # Returns the strategy the file was staged with. Destinations are
+        # replaced rather than written to, since they may be links themselves
+        if os.path.lexists(dst):
+            os.remove(dst)
+        if FileSystem.linkfile(src, dst, strategy):
+            if strategy == 'reflink' and metadata:
+                shutil.copystat(src, dst)
+            return strategy
+        if not CopyEngine.copy_file_range(src, dst):
+            # shutil uses sendfile or fcopyfile where the platform has them
+            shutil.copyfile(src, dst)
+        if metadata:
+            shutil.copystat(src, dst)
+        return 'copy'
+
+    def file_hash(path):
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def sync(self, dst, src, metadata):
+        # Returns the strategy the file was staged with, or None when the
+        # destination was up to date, along with the manifest record of the
+        # destination
+        srcstat = os.stat(src)
+        record = self.previous['files'].get(dst)
+        try:
+            dststat = os.lstat(dst)
+        except OSError:
+            dststat = None
+
+        if record is not None and dststat is not None and record[0] == src and record[3:5] == [dststat.st_size, dststat.st_mtime_ns]:
+            if record[1:3] == [srcstat.st_size, srcstat.st_mtime_ns]:
+                return None, record
+            if record[1] == srcstat.st_size:
+                digest = record[5] if record[5] else CopyEngine.file_hash(dst)
+                if CopyEngine.file_hash(src) == digest:
+                    if metadata:
+                        shutil.copystat(src, dst)
+                    dststat = os.lstat(dst)
+                    return None, [src, srcstat.st_size, srcstat.st_mtime_ns, dststat.st_size, dststat.st_mtime_ns, digest]
+
+        staged = CopyEngine.copy(src, dst, metadata, self.strategy)
+        dststat = os.lstat(dst)
+        return staged, [src, srcstat.st_size, srcstat.st_mtime_ns, dststat.st_size, dststat.st_mtime_ns, None]
+
+    def remove_previous(self):
+        # Removes what the previous run copied and this one doesn't
+        removed = 0
+        for dst in list(self.previous['files']) + list(self.previous['links']):
+            if dst in self.files or dst in self.links:
+                continue
+            if os.path.lexists(dst) and not os.path.isdir(dst):
+                os.remove(dst)
+                removed += 1
+        for dst in sorted(self.previous['dirs'], reverse=True):
+            if dst not in self.dirs and os.path.isdir(dst) and not os.path.islink(dst) and len(os.listdir(dst)) == 0:
+                os.rmdir(dst)
+        return removed
+
+    def save_manifest(self, records):
+        os.makedirs(os.path.dirname(os.path.abspath(self.manifest)), exist_ok=True)
+        with open(self.manifest + '.tmp', 'w') as f:
+            json.dump({ "files" : records, "links" : self.links, "dirs" : sorted(self.dirs) }, f)
+        os.replace(self.manifest + '.tmp', self.manifest)
+
+    def parents(self):
+        parents = set(self.dirs)
+        for dst in list(self.files) + list(self.links):
+            parents.add(os.path.dirname(dst))
+        return sorted(parent for parent in parents if parent)
+
+    def __call__(self):
+        start = time.time()
+        removed = self.remove_previous() if self.manifest else 0
+
+        created = set()
+        for path in self.parents():
+            if path in created:
+                continue
+            try:
+                os.makedirs(path, exist_ok=True)
+            except FileExistsError:
+                # A file copied by the previous run, where a directory goes now
+                os.remove(path)
+                os.makedirs(path)
+            while path and path not in created:
+                created.add(path)
+                path = os.path.dirname(path)
+
+        for dst, linkto in self.links.items():
+            if os.path.islink(dst) and os.readlink(dst) == linkto:
+                continue
+            if os.path.lexists(dst):
+                os.remove(dst)
+            os.symlink(linkto, dst)
+
+        size = 0
+        staged = {}
+        records = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            futures = [(dst, executor.submit(self.sync, dst, src, metadata)) for dst, (src, metadata) in self.files.items()]
+            for dst, future in futures:
+                strategy, records[dst] = future.result()
+                if strategy is not None:
+                    size += records[dst][3]
+                    staged[strategy] = staged.get(strategy, 0) + 1
+        copied = sum(staged.values())
+
+        # Directory times are restored last, since copying into them changes them
+        for dst in sorted(self.dirs, reverse=True):
+            shutil.copystat(self.dirs[dst], dst)
+
+        if self.manifest:
+            self.save_manifest(records)
+
+        elapsed = time.time() - start
+        megabytes = size / (1024 * 1024)
+        linked = ''.join(', ' + str(staged[strategy]) + ' as ' + strategy + 's' for strategy in ('hardlink', 'reflink') if strategy in staged)
+        print(
+            'Copied ' + str(copied) + ' files' + linked +
+            (', ' + str(len(self.links)) + ' symlinks' if self.links else '') +
+            ' (' + '{:.1f}'.format(megabytes) + 'MB)' +
+            (', ' + str(len(self.files) - copied) + ' unchanged' if copied < len(self.files) else '') +
+            (', removed ' + str(removed) if removed else '') +
+            ' in ' + '{:.2f}'.format(elapsed) + 's' +
+            (', ' + '{:.1f}'.format(megabytes / elapsed) + 'MB/s' if elapsed > 0 else '') +
+            ' with ' + str(self.jobs) + ' threads')
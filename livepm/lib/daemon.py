@@ -0,0 +1,255 @@
+import os
+import sys
+import json
+import socket
+import signal
+import threading
+import traceback
+
+# Serves livepm commands over a Unix socket, keeping caches between them.
+# Clients pass their stdin, stdout and stderr along, and run the command
+# themselves when no daemon is serving
+class Daemon:
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    def __init__(self, path = None):
+        self.path = path if path else Daemon.default_path()
+        self.lock = threading.Lock()
+        self.running = False
+        self.interrupted = False
+
+    def default_path():
+        if 'LIVEPM_DAEMON_SOCKET' in os.environ:
+            return os.environ['LIVEPM_DAEMON_SOCKET']
+        return os.path.join(os.path.expanduser('~'), '.livepm', 'daemon.sock')
+
+    def supported():
+        return hasattr(socket, 'AF_UNIX') and hasattr(socket, 'send_fds')
+
+    def connect(path):
+        if not Daemon.supported() or not os.path.exists(path):
+            return None
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(path)
+        except OSError:
+            sock.close()
+            return None
+        return sock
+
+    def request(sock, request, fds = []):
+        Daemon.send(sock, request, fds)
+        return Daemon.receive(sock)
+
+    def send(sock, request, fds = []):
+        socket.send_fds(sock, [(json.dumps(request) + '\n').encode('utf-8')], fds)
+
+    def receive(sock):
+        data = b''
+        while not data.endswith(b'\n'):
+            chunk = sock.recv(4096)
+            if not chunk:
+                return None
+            data += chunk
+        return json.loads(data.decode('utf-8'))
+
+    def forward(argv, path = None):
+        # Returns the exit code of the command run by the daemon, or None when
+        # there's no daemon to run it
+        if os.environ.get('LIVEPM_NO_DAEMON'):
+            return None
+        sock = Daemon.connect(path if path else Daemon.default_path())
+        if sock is None:
+            return None
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+        try:
+            try:
+                Daemon.send(sock, {
+                    "root" : Daemon.root,
+                    "argv" : argv,
+                    "cwd" : os.getcwd(),
+                    "environ" : dict(os.environ)
+                }, [0, 1, 2])
+            except OSError:
+                return None
+
+            # Once the request is sent the daemon may be running the command,
+            # so it's never run again in process
+            try:
+                reply = Daemon.receive(sock)
+            except KeyboardInterrupt:
+                # Closing the connection interrupts the command in the daemon
+                return 130
+            except OSError as e:
+                reply = None
+                print('livepm daemon: ' + str(e), file=sys.stderr)
+        finally:
+            sock.close()
+
+        if reply is None:
+            print('livepm daemon: lost connection to the daemon while it ran the command', file=sys.stderr)
+            return 1
+        if 'error' in reply:
+            # The daemon refused the command without running it
+            print('livepm daemon: ' + reply['error'] + ', running in process', file=sys.stderr)
+            return None
+        return reply['exitcode']
+
+    def stop(path = None):
+        sock = Daemon.connect(path if path else Daemon.default_path())
+        if sock is None:
+            return False
+        try:
+            Daemon.request(sock, { "stop" : True })
+        finally:
+            sock.close()
+        return True
+
+    def serve(self):
+        from livepm.main import run
+        from livepm.lib.directoryindex import DirectoryIndex
+
+        if not Daemon.supported():
+            raise Exception("The daemon requires Unix domain sockets with file descriptor passing")
+
+        if Daemon.connect(self.path) is not None:
+            raise Exception("A daemon is already serving \'" + self.path + "\'")
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+        DirectoryIndex.active = DirectoryIndex()
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask = os.umask(0o177)
+        try:
+            server.bind(self.path)
+        finally:
+            os.umask(umask)
+        server.listen(16)
+
+        print('livepm daemon serving \'' + self.path + '\' (pid ' + str(os.getpid()) + ')')
+        sys.stdout.flush()
+        try:
+            while True:
+                conn, address = server.accept()
+                with conn:
+                    try:
+                        if not self.handle(conn, run):
+                            break
+                    except KeyboardInterrupt:
+                        if not self.interrupted:
+                            raise
+                    except OSError as e:
+                        print('livepm daemon: ' + str(e))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            DirectoryIndex.active = None
+        print('livepm daemon stopped')
+
+    def handle(self, conn, run):
+        data, fds, flags, address = socket.recv_fds(conn, 1024 * 1024, 3)
+        try:
+            while not data.endswith(b'\n'):
+                chunk = conn.recv(1024 * 1024)
+                if not chunk:
+                    return True
+                data += chunk
+            request = json.loads(data.decode('utf-8'))
+
+            if request.get('stop'):
+                conn.sendall(b'{"exitcode": 0}\n')
+                return False
+            if request.get('root') != Daemon.root:
+                conn.sendall((json.dumps({ "error" : "daemon serves livepm from " + Daemon.root }) + '\n').encode('utf-8'))
+                return True
+            if len(fds) != 3:
+                conn.sendall(b'{"error": "missing standard streams"}\n')
+                return True
+
+            print('livepm ' + ' '.join(request['argv']) + ' (' + request['cwd'] + ')')
+            sys.stdout.flush()
+            exitcode = self.run(conn, run, request, fds)
+            print('  exited with ' + str(exitcode))
+            sys.stdout.flush()
+            if not self.interrupted:
+                conn.sendall((json.dumps({ "exitcode" : exitcode }) + '\n').encode('utf-8'))
+            return True
+        finally:
+            for fd in fds:
+                os.close(fd)
+
+    def watch(self, conn):
+        # The client only closes its end early when it's interrupted. Processes
+        # started by the command aren't in the process group of the client, so
+        # they're terminated here, and the command is interrupted like Ctrl+C would
+        from livepm.lib.process import Process
+        try:
+            conn.recv(1)
+        except OSError:
+            pass
+        with self.lock:
+            if self.running:
+                self.interrupted = True
+                Process.terminate_all()
+                signal.pthread_kill(threading.main_thread().ident, signal.SIGINT)
+
+    def run(self, conn, run, request, fds):
+        streams = (sys.stdin, sys.stdout, sys.stderr)
+        savedfds = [os.dup(fd) for fd in range(3)]
+        environ = dict(os.environ)
+        cwd = os.getcwd()
+
+        self.interrupted = False
+        with self.lock:
+            self.running = True
+        threading.Thread(target=self.watch, args=(conn,), daemon=True).start()
+
+        exitcode = 0
+        try:
+            for fd in range(3):
+                os.dup2(fds[fd], fd)
+            sys.stdin = open(0, 'r', closefd=False)
+            sys.stdout = open(1, 'w', buffering=1, closefd=False, errors='backslashreplace')
+            sys.stderr = open(2, 'w', buffering=1, closefd=False, errors='backslashreplace')
+            os.environ.clear()
+            os.environ.update(request['environ'])
+            os.chdir(request['cwd'])
+
+            try:
+                run(request['argv'])
+            except SystemExit as e:
+                if e.code is None:
+                    exitcode = 0
+                elif isinstance(e.code, int):
+                    exitcode = e.code
+                else:
+                    print(e.code, file=sys.stderr)
+                    exitcode = 1
+            except KeyboardInterrupt:
+                exitcode = 130
+            except Exception:
+                traceback.print_exc()
+                exitcode = 1
+        finally:
+            with self.lock:
+                self.running = False
+            for stream in (sys.stdout, sys.stderr):
+                try:
+                    stream.flush()
+                except (OSError, ValueError):
+                    pass
+            sys.stdin, sys.stdout, sys.stderr = streams
+            for fd in range(3):
+                os.dup2(savedfds[fd], fd)
+                os.close(savedfds[fd])
+            os.environ.clear()
+            os.environ.update(environ)
+            os.chdir(cwd)
+        return exitcode
@@ -1,5 +1,6 @@
 from livepm.lib.version import *
 from livepm.lib.minimalgit import *
+from livepm.lib.buildtrace import BuildTrace
 import os
 
 class Dependency:
@@ -8,16 +9,25 @@ class Dependency:
         self.version = Version(options['version'])
         self.repository = options['repository']
 
+        # Paths of the repository needed to build the dependency. Declaring them
+        # makes a blobless partial clone by default, unless 'filter' says otherwise
+        self.sparse = options['sparse'] if 'sparse' in options else None
+        self.filter = options['filter'] if 'filter' in options else ('blob:none' if self.sparse else None)
+        self.options = options
+
     def __call__(self, sourcedir, releasedir, releaseid, options = {}):
         dependencydir = os.path.join(sourcedir, 'dependencies')
-        if not os.path.exists(dependencydir):
-            os.makedirs(dependencydir)
+        os.makedirs(dependencydir, exist_ok=True)
 
         self.repodir = os.path.join(sourcedir, 'dependencies/' + self.name)
         self.releasedir = os.path.join(releasedir, self.name)
         if ( not os.path.exists(self.repodir) ):
             try:
-                MinimalGit(self.repository).clone('dev', self.repodir, sourcedir)
+                with BuildTrace.span('clone ' + self.name, 'dependency', { "package" : self.name, "repository" : self.repository }):
+                    mirror = options['mirror'] if 'mirror' in options else None
+                    reference = mirror.update(self.repository) if mirror else None
+                    depth = options['depth'] if 'depth' in options else None
+                    MinimalGit(self.repository).clone('dev', self.repodir, sourcedir, self.filter, self.sparse, reference, depth)
             except Exception as e:
                 print("Failed to clone repo to \'" + sourcedir + "\': " + str(e))
                 print("Clone the repo manually in order to continue.")
@@ -27,8 +37,13 @@ class Dependency:
         return str(self.name) + '(' + str(self.version) + ')'
 
     def to_json(self):
-        return {
+        result = {
             "name" : self.name,
             "version" : str(self.version),
             "repository" : self.repository
         }
+        if 'sparse' in self.options:
+            result['sparse'] = self.sparse
+        if 'filter' in self.options:
+            result['filter'] = self.filter
+        return result
@@ -1,5 +1,6 @@
 import sys
 import os
+import heapq
 
 class DependencyTree:
 
@@ -7,41 +8,94 @@ class DependencyTree:
         self.tree = tree
 
     def build_order(self):
-        self.build_order = []
+        graph = self.dependencies()
 
-        order_solved = False
-        while not order_solved:
-            order_solved = True
-            for key, value in self.tree.items():
-                if not self._solve_build_order(key, value):
-                    order_solved = False
+        # Ties between nodes that are ready at the same time are broken by their
+        # post-order position in the tree, which keeps the order deterministic and
+        # equal to a depth-first walk of the tree whenever there are no cycles
+        position = DependencyTree._post_order(graph, list(graph))
 
-        return self.build_order
+        indegree = {}
+        dependents = {}
+        for name, depends in graph.items():
+            indegree[name] = len(depends)
+            dependents.setdefault(name, [])
+            for depend in depends:
+                dependents.setdefault(depend, []).append(name)
 
-    def _solve_build_order(self, name, node):
-        build_order_solved = True
+        ready = [(position[name], name) for name, degree in indegree.items() if degree == 0]
+        heapq.heapify(ready)
 
-        if len(node) == 0:
-            if name not in self.build_order:
-                self.build_order.append(name)
-        else:
-            has_all_deps = True
+        order = []
+        while ready:
+            _, name = heapq.heappop(ready)
+            order.append(name)
+            for dependent in dependents[name]:
+                indegree[dependent] -= 1
+                if indegree[dependent] == 0:
+                    heapq.heappush(ready, (position[dependent], dependent))
 
-            for key, value in node.items():
-                if not self._solve_build_order(key, value):
-                    build_order_solved = False
-                    
-                if key not in self.build_order:
-                    has_all_deps = False
+        if len(order) != len(graph):
+            unresolved = [name for name in graph if indegree[name] > 0]
+            raise Exception("Dependency cycle detected: " + ' -> '.join(DependencyTree._find_cycle(graph, unresolved)))
 
-            if has_all_deps and name not in self.build_order:
-                self.build_order.append(name)
-            if not has_all_deps:
-                build_order_solved = False
+        return order
 
-        return build_order_solved
-                    
-                    
+    def dependencies(self):
+        # Flattens the nested tree into a name -> dependencies map. Subtrees that
+        # are shared between several packages are only walked once
+        graph = {}
+        visited = set()
+        stack = [iter(self.tree.items())]
+        while stack:
+            item = next(stack[-1], None)
+            if item is None:
+                stack.pop()
+                continue
 
-            
+            key, value = item
+            depends = graph.setdefault(key, [])
+            if (key, id(value)) in visited:
+                continue
+            visited.add((key, id(value)))
 
+            for depend in value:
+                if depend not in depends:
+                    depends.append(depend)
+            stack.append(iter(value.items()))
+
+        return graph
+
+    def _post_order(graph, roots):
+        position = {}
+        visiting = set()
+        for root in roots:
+            if root in position:
+                continue
+            stack = [(root, iter(graph[root]))]
+            visiting.add(root)
+            while stack:
+                name, children = stack[-1]
+                child = next(children, None)
+                if child is None:
+                    stack.pop()
+                    visiting.discard(name)
+                    position[name] = len(position)
+                elif child not in position and child not in visiting:
+                    visiting.add(child)
+                    stack.append((child, iter(graph[child])))
+        return position
+
+    def _find_cycle(graph, candidates):
+        # Walk dependency edges between unresolved nodes until a node repeats.
+        # Every unresolved node has at least one unresolved dependency, so the
+        # walk is guaranteed to close a cycle
+        unresolved = set(candidates)
+        path = [candidates[0]]
+        index = {candidates[0]: 0}
+        while True:
+            name = next(depend for depend in graph[path[-1]] if depend in unresolved)
+            if name in index:
+                return path[index[name]:] + [name]
+            index[name] = len(path)
+            path.append(name)
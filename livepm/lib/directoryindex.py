@@ -0,0 +1,67 @@
+import os
+import time
+import threading
+
+# Directory listings kept between daemon commands, reused while the mtime of
+# the directory is unchanged and older than the racy window
+class DirectoryIndex:
+    active = None
+    racy = 2 * 1000 * 1000 * 1000
+
+    def __init__(self):
+        self.listings = {}
+        self.lock = threading.Lock()
+
+    def walk(top):
+        if DirectoryIndex.active is None:
+            return os.walk(top)
+        return DirectoryIndex.active.walk_indexed(top)
+
+    def walk_indexed(self, top):
+        stack = [top]
+        while stack:
+            root = stack.pop()
+            listing = self.listing(root)
+            if listing is None:
+                continue
+            dirs, links, files = listing
+            dirs = list(dirs)
+            yield root, dirs, list(files)
+            for name in reversed(dirs):
+                if name not in links:
+                    stack.append(os.path.join(root, name))
+
+    def listing(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        with self.lock:
+            entry = self.listings.get(path)
+        if entry is not None and entry[0] == (st.st_mtime_ns, st.st_ino) and entry[1] - st.st_mtime_ns > DirectoryIndex.racy:
+            return entry[2]
+
+        scanned = time.time_ns()
+        dirs = []
+        links = set()
+        files = []
+        try:
+            with os.scandir(path) as it:
+                for e in it:
+                    try:
+                        isdir = e.is_dir()
+                    except OSError:
+                        isdir = False
+                    if isdir:
+                        dirs.append(e.name)
+                        if e.is_symlink():
+                            links.add(e.name)
+                    else:
+                        files.append(e.name)
+        except OSError:
+            return None
+
+        listing = (dirs, links, files)
+        with self.lock:
+            self.listings[path] = ((st.st_mtime_ns, st.st_ino), scanned, listing)
+        return listing
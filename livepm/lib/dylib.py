@@ -1,6 +1,5 @@
 import os
 import platform
-import fnmatch
 import shutil
 import sys
 import stat
@@ -12,6 +11,10 @@ from macholib.util import fsencoding
 from macholib import MachO
 from macholib import mach_o
 
+from livepm.lib.filesystem import FileSystem
+from livepm.lib.globmatcher import GlobMatcher
+from livepm.lib.lrucache import LruCache
+
 # A set of functions used from machotools
 #
 # Copyright (c) 2013, Enthought, Inc.
@@ -292,6 +295,11 @@ def _add_rpath_to_header(header, rpath):
 
 
 class DylibLinkInfo:
+
+    # Link info of the most recently parsed files, keyed by path and stat,
+    # which the daemon keeps between commands
+    parsed = LruCache(4096)
+
     def __init__(self, path):
         self.path = path
         if ( not os.path.exists(path) ):
@@ -300,6 +308,15 @@ class DylibLinkInfo:
         self.dependencies = []
         self.rpath_info = []
 
+        st = os.stat(path)
+        stamp = (st.st_mtime_ns, st.st_size, st.st_ino)
+        parsed = DylibLinkInfo.parsed.get(os.path.abspath(path), stamp)
+        if parsed is not None:
+            dependencies, rpath_info = parsed
+            self.dependencies = list(dependencies)
+            self.rpath_info = list(rpath_info)
+            return
+
         m = MachO.MachO(path)
         deps = _list_dependencies_macho(m)
         if ( len(deps) > 0 ):
@@ -315,21 +332,15 @@ class DylibLinkInfo:
             else:
                 self.rpath_info = rpaths
 
+        DylibLinkInfo.parsed.put(os.path.abspath(path), stamp, (list(self.dependencies), list(self.rpath_info)))
 
-    def find_dependencies(self, pattern):
-        result = []
-        for l in self.dependencies:
-            if ( fnmatch.fnmatch(l, pattern) ):
-                result.append(l)
 
-        return result
+    def find_dependencies(self, pattern):
+        return GlobMatcher.compile((pattern,)).filter(self.dependencies)
 
     def find_absolute_dependencies(self, pattern):
-        result = []
-        for l in self.dependencies:
-            if ( fnmatch.fnmatch(self.absolute_dependency(l), pattern) ):
-                result.append(l)
-        return result
+        matcher = GlobMatcher.compile((pattern,))
+        return [l for l in self.dependencies if matcher.matches(self.absolute_dependency(l))]
 
     def absolute_dependency(self, dependency):
         if dependency.startswith('@rpath'):
@@ -363,6 +374,7 @@ class DylibLinkInfo:
     def change_id(self, old, new):
         for index, dep in enumerate(self.dependencies):
             if dep == old:
+                FileSystem.breakLink(self.path)
                 changeproc = Process.run(
                     ['install_name_tool', '-id', dep, new, self.path], 
                     os.getcwd()
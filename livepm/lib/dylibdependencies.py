@@ -1,10 +1,10 @@
 import os
 import platform
-import fnmatch
 import shutil
 
 from livepm.lib.process import Process
 from livepm.lib.filesystem import FileSystem
+from livepm.lib.globmatcher import GlobMatcher
 from livepm.lib.dylibexternal import DylibLinkInfoExternal
 from livepm.lib.dylib import DylibLinkInfo
 
@@ -57,6 +57,7 @@ class DylibDependencyTransfer:
         self.custom_copy = options['custom']
         self.copy_from = options['dependencies'] + '/'
         self.copy_to = options['destination']
+        custom_matcher = GlobMatcher(self.custom_copy)
 
         for key, value in self.library_map.hierarchy.items():
             copy_info = {}
@@ -66,10 +67,11 @@ class DylibDependencyTransfer:
             if last_slash > 0:
                 lib_name = new_path[last_slash + 1:]
 
-                for custom_search, overwrite_path in self.custom_copy.items():
-                    if fnmatch.fnmatch(new_path, custom_search):
-                        last_slash = len(overwrite_path)
-                        new_path = overwrite_path + '/' + lib_name
+                custom_search = custom_matcher.match(new_path)
+                if custom_search is not None:
+                    overwrite_path = self.custom_copy[custom_search]
+                    last_slash = len(overwrite_path)
+                    new_path = overwrite_path + '/' + lib_name
 
 
                 copy_info['old_path'] = key
@@ -89,6 +91,8 @@ class DylibDependencyTransfer:
                 os.makedirs(self.copy_to + '/' + copy_info['path_dir'])
                 print_call('Made dir: ' + self.copy_to + '/' + copy_info['path_dir'])
 
+            if os.path.lexists(self.copy_to + '/' + copy_info['path']):
+                os.remove(self.copy_to + '/' + copy_info['path'])
             shutil.copyfile(key, self.copy_to + '/' + copy_info['path'])
             print_call('Copied: ' + self.copy_to + '/' + copy_info['path'])
 
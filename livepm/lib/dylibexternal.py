@@ -1,10 +1,10 @@
 import os
 import platform
-import fnmatch
 import shutil
 
 from livepm.lib.process import Process
 from livepm.lib.filesystem import FileSystem
+from livepm.lib.globmatcher import GlobMatcher
 
 class DylibLinkInfoExternal:
 
@@ -58,19 +58,11 @@ class DylibLinkInfoExternal:
             collect.append(line.strip())
 
     def find_dependencies(self, pattern):
-        result = []
-        for l in self.dependencies:
-            if ( fnmatch.fnmatch(l, pattern) ):
-                result.append(l)
-
-        return result
+        return GlobMatcher.compile((pattern,)).filter(self.dependencies)
 
     def find_absolute_dependencies(self, pattern):
-        result = []
-        for l in self.dependencies:
-            if ( fnmatch.fnmatch(self.absolute_dependency(l), pattern) ):
-                result.append(l)
-        return result
+        matcher = GlobMatcher.compile((pattern,))
+        return [l for l in self.dependencies if matcher.matches(self.absolute_dependency(l))]
 
     def absolute_dependency(self, dependency):
         if dependency.startswith('@rpath'):
@@ -1,9 +1,28 @@
 import os
+import sys
+import stat
 import shutil
-import fnmatch
+import hashlib
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from livepm.lib.directoryindex import DirectoryIndex
+from livepm.lib.globmatcher import GlobMatcher
 
 class FileSystem:
 
+    # Ways of putting a copy of a file in place. Hardlinks and reflinks only
+    # cost metadata operations, and fall back to copying where the
+    # filesystem doesn't support them, e.g. across devices
+    link_strategies = ['copy', 'hardlink', 'reflink']
+
+    # FICLONE ioctl, which shares the data of two files on btrfs and xfs
+    # until either is written to
+    FICLONE = 0x40049409
+
     def scriptdir():
         return os.path.dirname(os.path.realpath(__file__))
 
@@ -13,59 +32,110 @@ class FileSystem:
                 return os.path.join(root, name)
         return ''
 
-    def copyfile(src, dst):
-        if os.path.islink(src):
-            linkto = os.readlink(src)
-            os.symlink(linkto, dst)
-        else:
-            shutil.copyfile(src, dst)
+    def hashTree(path, exclude = []):
+        # Hashes the layout, sizes and modification times of all files under path.
+        # Cheaper than hashing contents, and any edit or checkout changes it
+        path = os.path.abspath(path)
+        exclude = [os.path.abspath(p) for p in exclude]
+        h = hashlib.sha256()
+        for root, dirs, files in DirectoryIndex.walk(path):
+            dirs[:] = sorted(d for d in dirs if d != '.git' and os.path.join(root, d) not in exclude)
+            for file in sorted(files):
+                filepath = os.path.join(root, file)
+                if filepath in exclude:
+                    continue
+                try:
+                    st = os.lstat(filepath)
+                except OSError:
+                    continue
+                h.update((os.path.relpath(filepath, path) + '\0' + str(st.st_size) + '\0' + str(st.st_mtime_ns) + '\n').encode('utf-8', 'surrogateescape'))
+        return h.hexdigest()
+
+    def linkfile(src, dst, strategy):
+        # Returns False when the file has to be copied instead
+        if strategy == 'hardlink':
+            try:
+                os.link(src, dst)
+                return True
+            except OSError:
+                return False
+        elif strategy == 'reflink':
+            if fcntl is None or not sys.platform.startswith('linux'):
+                return False
+            with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+                try:
+                    fcntl.ioctl(fdst.fileno(), FileSystem.FICLONE, fsrc.fileno())
+                    return True
+                except OSError:
+                    return False
+        return False
+
+    def breakLink(path):
+        # Gives a file staged as a hardlink its own copy of the data, so it can
+        # be written to in place without changing the file it was linked from
+        try:
+            st = os.lstat(path)
+        except OSError:
+            return False
+        if not stat.S_ISREG(st.st_mode) or st.st_nlink < 2:
+            return False
+        tmppath = path + '.livepm-unlink'
+        shutil.copy2(path, tmppath)
+        os.replace(tmppath, path)
+        return True
+
+    def isPattern(path):
+        return "*" in path or "?" in path
 
     def listEntries(src):
+        # Wildcards in the file name are matched against the entries of its
+        # directory. Wildcards in directories, like lib/**/*.so, are matched
+        # against the files below the last directory without any
+        if not FileSystem.isPattern(src):
+            return []
+        # Relative patterns give paths relative to the working dir, like glob
+        d = os.path.dirname(src)
+        if not FileSystem.isPattern(d):
+            return [os.path.join(d, file) for file in GlobMatcher.compile((os.path.basename(src),)).filter(os.listdir(d if d else os.curdir))]
+
+        parts = src.replace(os.sep, '/').split('/')
+        index = next(i for i, part in enumerate(parts) if FileSystem.isPattern(part))
+        root = '/'.join(parts[:index])
+        if index == 1 and root == '':
+            root = '/'
+        matcher = GlobMatcher.compile(('/'.join(parts[index:]),))
         entries = []
-        srcfilename = os.path.basename(src)
-        if "*" in srcfilename or "?" in srcfilename:
-            d = os.path.dirname(src)
-            for file in os.listdir(d):
-                if fnmatch.fnmatch(file, srcfilename):
-                    entries.append(os.path.join(d, file))
+        for subdir, dirs, files in os.walk(root if root else os.curdir):
+            relpath = os.path.relpath(subdir, root if root else os.curdir).replace(os.sep, '/')
+            for file in files:
+                path = file if relpath == '.' else relpath + '/' + file
+                if matcher.matches(path):
+                    entries.append(os.path.join(root, path) if root else path)
         return entries
 
-    def copyFileOrDirectory(src, dst):
-        if os.path.isdir(src):
+    def copyTargets(src, dst):
+        # Resolves a copy entry into concrete (source, destination) pairs. A
+        # destination ending in '-' takes the name of the source
+        targets = []
+        if not os.path.isdir(src) and FileSystem.isPattern(src):
+            for entry in FileSystem.listEntries(src):
+                dstfile = dst
+                if os.path.basename(os.path.normpath(dst)) == "-":
+                    dstfile = dst[0:len(dst) - 1] + os.path.basename(entry)
+                targets.append((entry, dstfile))
+        else:
             if os.path.basename(os.path.normpath(dst)) == "-":
                 dst = dst[0:len(dst) - 1] + os.path.basename(os.path.normpath(src))
-            shutil.copytree(src, dst)
-        else:
-            filedir  = os.path.dirname(dst)
-            if not os.path.exists(filedir):
-                os.makedirs(filedir)
+            targets.append((src, dst))
+        return targets
 
-            srcfilename = os.path.basename(src)
-            if "*" in srcfilename or "?" in srcfilename:
-                copiedFiles = 0
-                for file in os.listdir(os.path.dirname(src)):
-                    if fnmatch.fnmatch(file, srcfilename):
-                        dstfile = dst
-                        if os.path.basename(os.path.normpath(dst)) == "-":
-                            dstfile = dst[0:len(dst) - 1] + file
-                        src = os.path.join(os.path.dirname(src), file)
-                        print('Copying: \'' + src + '\'\n      -> \'' + dstfile + '\'')
-                        FileSystem.copyfile(src, dstfile)
-                        copiedFiles += 1
-
-                if ( copiedFiles == 0 ):
-                    print('Warning: No files copied for pattern: ' + src)
-            else:
-                if os.path.basename(os.path.normpath(dst)) == "-":
-                    dst = dst[0:len(dst) - 1] + os.path.basename(os.path.normpath(src))
-                FileSystem.copyfile(src, dst)
-                print('Copying: \'' + src + '\'\n      -> \'' + dst + '\'')
-
-    def copyFileStructure(releaseDir, structure, structurePaths, structurePrefix = ""):
+    def structureEntries(releaseDir, structure, structurePaths, structurePrefix = ""):
+        entries = []
         for key, value in structure.items():
             keywithpath   = key.format_map(structurePaths)
             if isinstance(value, dict):
-                FileSystem.copyFileStructure(releaseDir, value, structurePaths, os.path.join(structurePrefix, keywithpath))
+                entries += FileSystem.structureEntries(releaseDir, value, structurePaths, os.path.join(structurePrefix, keywithpath))
             else:
                 valuewithpath = value.format(structurePaths)
-                FileSystem.copyFileOrDirectory(os.path.join(structurePrefix, keywithpath), releaseDir + valuewithpath)
+                entries.append((os.path.join(structurePrefix, keywithpath), releaseDir + valuewithpath))
+        return entries
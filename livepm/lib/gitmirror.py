@@ -0,0 +1,46 @@
+import os
+import re
+import hashlib
+import threading
+
+from livepm.lib.process import Process
+from livepm.lib.filelock import FileLock
+
+# Bare mirrors of dependency repositories, which clones reference. Mirrors
+# are locked while fetched, between threads and processes
+class GitMirror:
+    def __init__(self, cachedir):
+        self.cachedir = os.path.abspath(cachedir)
+        self.locks = {}
+        self.lock = threading.Lock()
+
+    def default_dir():
+        return os.environ.get('LIVEPM_GIT_CACHE')
+
+    def path(self, repository):
+        name = re.sub(r'[^A-Za-z0-9_.-]', '_', os.path.basename(repository.rstrip('/')))
+        if name.endswith('.git'):
+            name = name[:-4]
+        return os.path.join(self.cachedir, name + '-' + hashlib.sha1(repository.encode('utf-8')).hexdigest()[:12] + '.git')
+
+    def update(self, repository):
+        path = self.path(repository)
+        with self.lock:
+            if path not in self.locks:
+                self.locks[path] = threading.Lock()
+            lock = self.locks[path]
+
+        with lock, FileLock(path + '.lock'):
+            if os.path.isdir(path):
+                proc = Process.run(['git', 'fetch', '--prune', 'origin'], path)
+                exitcode = Process.trace('GIT MIRROR: ', proc, end = '')
+                if exitcode != 0:
+                    print('GIT MIRROR: Failed to update \'' + path + '\', using it as it is.')
+                return path
+
+            proc = Process.run(['git', 'clone', '--mirror', repository, path], self.cachedir)
+            exitcode = Process.trace('GIT MIRROR: ', proc, end = '')
+            if exitcode != 0:
+                print('GIT MIRROR: Failed to mirror \'' + repository + '\', cloning without it.')
+                return None
+            return path
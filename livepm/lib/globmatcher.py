@@ -0,0 +1,116 @@
+import os
+import re
+import functools
+
+# Matches a set of fnmatch patterns in one regex, where the first matching
+# pattern wins. '**/' also matches any number of directories, including none
+class GlobMatcher:
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        if os.path.normcase('A/') != 'A/':
+            self.normcase = GlobMatcher.normcase
+            expressions = [GlobMatcher.translate(GlobMatcher.normcase(pattern)) for pattern in self.patterns]
+        else:
+            self.normcase = None
+            expressions = [GlobMatcher.translate(pattern) for pattern in self.patterns]
+        self.regex = re.compile('|'.join('(?P<p' + str(i) + '>' + e + ')' for i, e in enumerate(expressions)), re.DOTALL)
+
+    @functools.lru_cache(maxsize=256)
+    def compile(patterns):
+        # Matchers of pattern sets used over and over, given as a tuple
+        return GlobMatcher(patterns)
+
+    def normcase(path):
+        # Case insensitive like os.path.normcase on Windows, but with '/' as
+        # separator, which '**/' is translated with
+        return path.replace('\\', '/').lower()
+
+    def translate(pattern):
+        i = 0
+        n = len(pattern)
+        result = ''
+        while i < n:
+            c = pattern[i]
+            i += 1
+            if c == '*':
+                start = i - 1
+                if i < n and pattern[i] == '*':
+                    while i < n and pattern[i] == '*':
+                        i += 1
+                    if i < n and pattern[i] == '/' and (start == 0 or pattern[start - 1] == '/'):
+                        i += 1
+                        result += '(?:.*/)?'
+                    else:
+                        result += '.*'
+                elif not result.endswith('.*'):
+                    result += '.*'
+            elif c == '?':
+                result += '.'
+            elif c == '[':
+                j = i
+                if j < n and pattern[j] == '!':
+                    j += 1
+                if j < n and pattern[j] == ']':
+                    j += 1
+                while j < n and pattern[j] != ']':
+                    j += 1
+                if j >= n:
+                    result += '\\['
+                else:
+                    # Sets are translated the way fnmatch does, which drops
+                    # empty ranges and escapes regex set operations
+                    stuff = pattern[i:j]
+                    if '-' not in stuff:
+                        stuff = stuff.replace('\\', '\\\\')
+                    else:
+                        chunks = []
+                        k = i + 2 if pattern[i] == '!' else i + 1
+                        while True:
+                            k = pattern.find('-', k, j)
+                            if k < 0:
+                                break
+                            chunks.append(pattern[i:k])
+                            i = k + 1
+                            k = k + 3
+                        chunk = pattern[i:j]
+                        if chunk:
+                            chunks.append(chunk)
+                        else:
+                            chunks[-1] += '-'
+                        for k in range(len(chunks) - 1, 0, -1):
+                            if chunks[k - 1][-1] > chunks[k][0]:
+                                chunks[k - 1] = chunks[k - 1][:-1] + chunks[k][1:]
+                                del chunks[k]
+                        stuff = '-'.join(s.replace('\\', '\\\\').replace('-', '\\-') for s in chunks)
+                    stuff = re.sub(r'([&~|])', r'\\\1', stuff)
+                    i = j + 1
+                    if not stuff:
+                        result += '(?!)'
+                    elif stuff == '!':
+                        result += '.'
+                    else:
+                        if stuff[0] == '!':
+                            stuff = '^' + stuff[1:]
+                        elif stuff[0] in ('^', '['):
+                            stuff = '\\' + stuff
+                        result += '[' + stuff + ']'
+            else:
+                result += re.escape(c)
+        return result
+
+    def match(self, path):
+        # Returns the first pattern matching the whole path, or None
+        if self.normcase:
+            path = self.normcase(path)
+        m = self.regex.fullmatch(path)
+        if m is None:
+            return None
+        return self.patterns[int(m.lastgroup[1:])]
+
+    def matches(self, path):
+        if self.normcase:
+            path = self.normcase(path)
+        return self.regex.fullmatch(path) is not None
+
+    def filter(self, paths):
+        return [path for path in paths if self.matches(path)]
@@ -0,0 +1,51 @@
+import os
+import threading
+
+# GNU make jobserver, so every make started by livepm shares one pool of job
+# slots through MAKEFLAGS instead of each getting its own -j
+class JobServer:
+    active = None
+
+    def __init__(self, jobs = None):
+        self.jobs = jobs if jobs else (os.cpu_count() or 1)
+        self.lock = threading.Lock()
+        self.read_fd, self.write_fd = os.pipe()
+        os.set_inheritable(self.read_fd, True)
+        os.set_inheritable(self.write_fd, True)
+        os.write(self.write_fd, b'+' * self.jobs)
+
+    def acquire(self):
+        return os.read(self.read_fd, 1)
+
+    def release(self, token):
+        os.write(self.write_fd, token)
+
+    def fds(self):
+        return (self.read_fd, self.write_fd)
+
+    def makeflags(self):
+        fds = str(self.read_fd) + ',' + str(self.write_fd)
+        # --jobserver-fds is the name used by make versions before 4.0
+        return ' -j --jobserver-fds=' + fds + ' --jobserver-auth=' + fds
+
+    def environment(self, environment):
+        environment = dict(environment)
+        makeflags = environment.get('MAKEFLAGS', '')
+        environment['MAKEFLAGS'] = (makeflags + self.makeflags()).strip()
+        return environment
+
+    def close(self):
+        os.close(self.read_fd)
+        os.close(self.write_fd)
+
+    def start(jobs = None):
+        if os.name != 'posix':
+            return None
+        if JobServer.active is None:
+            JobServer.active = JobServer(jobs)
+        return JobServer.active
+
+    def stop():
+        if JobServer.active is not None:
+            JobServer.active.close()
+            JobServer.active = None
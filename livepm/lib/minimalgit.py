@@ -7,7 +7,57 @@ class MinimalGit:
     def __init__(self, repository):
         self.repository = repository
 
-    def clone(self, branch = 'master', location = None, cwd = os.getcwd()):
+    def clone(self, branch = 'master', location = None, cwd = os.getcwd(), filter = None, sparse = None, reference = None, depth = None):
+        # A filter such as 'blob:none' makes a partial clone, where file contents
+        # are only fetched when they are checked out. With sparse paths, only the
+        # files at the root of the repository and inside those dirs are checked out.
+        # A reference repository provides the objects it already has, and is
+        # dissociated from after the clone so it can be updated or removed.
         location_path = [] if location == None else [os.path.abspath(location)]
-        proc = Process.run(['git', 'clone', '-b', branch, self.repository] + location_path, cwd)
-        Process.trace('GIT: ', proc, end = '')
+        args = ['git', 'clone', '-b', branch]
+        if reference:
+            args += ['--reference', reference, '--dissociate']
+        if depth:
+            args.append('--depth=' + str(depth))
+        if filter:
+            args.append('--filter=' + filter)
+        if sparse:
+            args.append('--sparse')
+        proc = Process.run(args + [self.repository] + location_path, cwd)
+        exitcode = Process.trace('GIT: ', proc, end = '')
+        if exitcode != 0:
+            raise Exception("git clone exited with code " + str(exitcode))
+
+        repodir = location_path[0] if location_path else os.path.join(cwd, MinimalGit.repository_name(self.repository))
+        if sparse:
+            proc = Process.run(['git', 'sparse-checkout', 'set', '--'] + list(sparse), repodir)
+            exitcode = Process.trace('GIT: ', proc, end = '')
+            if exitcode != 0:
+                raise Exception("git sparse-checkout exited with code " + str(exitcode))
+
+        if filter or sparse:
+            files, worktree, objects = MinimalGit.disk_usage(repodir)
+            print('GIT: Checked out ' + str(files) + ' files, ' +
+                  MinimalGit.megabytes(worktree) + ' in working tree, ' + MinimalGit.megabytes(objects) + ' in .git')
+
+    def repository_name(repository):
+        name = os.path.basename(repository.rstrip('/'))
+        return name[:-4] if name.endswith('.git') else name
+
+    def disk_usage(repodir):
+        files = 0
+        worktree = 0
+        objects = 0
+        for root, dirs, filenames in os.walk(repodir):
+            isgit = root == os.path.join(repodir, '.git') or root.startswith(os.path.join(repodir, '.git') + os.sep)
+            for filename in filenames:
+                size = os.lstat(os.path.join(root, filename)).st_size
+                if isgit:
+                    objects += size
+                else:
+                    files += 1
+                    worktree += size
+        return (files, worktree, objects)
+
+    def megabytes(size):
+        return '{:.1f}'.format(size / (1024 * 1024)) + 'MB'
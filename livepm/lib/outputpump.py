@@ -0,0 +1,113 @@
+import os
+import sys
+import io
+import codecs
+import queue
+import threading
+
+class OutputPumpStream:
+    def __init__(self, fd, prefix):
+        self.fd = fd
+        self.prefix = prefix
+        self.pending = ''
+        self.decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder('utf-8')(errors='replace'), translate=True)
+
+    def feed(self, chunk, final = False):
+        data = self.pending + self.decoder.decode(chunk, final)
+        if final:
+            self.pending = ''
+            if data and not data.endswith('\n'):
+                data += '\n'
+        else:
+            lastnewline = data.rfind('\n')
+            self.pending = data[lastnewline + 1:]
+            data = data[:lastnewline + 1]
+
+        if not data or not self.prefix:
+            return data
+        return self.prefix + data[:-1].replace('\n', '\n' + self.prefix) + '\n'
+
+
+# Copies child output to stdout in chunks, prefixed per child, without
+# mixing lines of different children
+class OutputPump:
+    def __init__(self, out = None, log = None, chunksize = 65536):
+        self.out = out
+        self.log = log
+        self.chunksize = chunksize
+        self.streams = []
+
+    def add(self, stream, prefix = ''):
+        fd = stream if isinstance(stream, int) else stream.fileno()
+        self.streams.append(OutputPumpStream(fd, prefix))
+
+    def write(self, data):
+        if not data:
+            return
+        out = self.out if self.out is not None else sys.stdout
+        if out:
+            out.write(data)
+            out.flush()
+        if self.log:
+            self.log.write(data)
+
+    def run(self):
+        if os.name == 'posix':
+            self.run_selector()
+        else:
+            self.run_threads()
+
+    def run_selector(self):
+        import selectors
+        selector = selectors.DefaultSelector()
+        for stream in self.streams:
+            selector.register(stream.fd, selectors.EVENT_READ, stream)
+
+        open_streams = len(self.streams)
+        while open_streams > 0:
+            batch = []
+            for key, events in selector.select():
+                stream = key.data
+                chunk = os.read(stream.fd, self.chunksize)
+                if chunk:
+                    batch.append(stream.feed(chunk))
+                else:
+                    batch.append(stream.feed(b'', True))
+                    selector.unregister(stream.fd)
+                    open_streams -= 1
+            self.write(''.join(batch))
+        selector.close()
+
+    def run_threads(self):
+        chunks = queue.Queue()
+
+        def reader(stream):
+            while True:
+                chunk = os.read(stream.fd, self.chunksize)
+                chunks.put((stream, chunk))
+                if not chunk:
+                    break
+
+        threads = [threading.Thread(target=reader, args=(stream,), daemon=True) for stream in self.streams]
+        for thread in threads:
+            thread.start()
+
+        open_streams = len(self.streams)
+        while open_streams > 0:
+            batch = []
+            item = chunks.get()
+            while item is not None:
+                stream, chunk = item
+                if chunk:
+                    batch.append(stream.feed(chunk))
+                else:
+                    batch.append(stream.feed(b'', True))
+                    open_streams -= 1
+                try:
+                    item = chunks.get_nowait()
+                except queue.Empty:
+                    item = None
+            self.write(''.join(batch))
+
+        for thread in threads:
+            thread.join()
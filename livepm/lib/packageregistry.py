@@ -0,0 +1,61 @@
+import os
+import copy
+import json
+import threading
+
+from livepm.lib.configuration import Configuration
+from livepm.lib.lrucache import LruCache
+
+# Packages parsed and resolved once per run, keyed by real path and mtime.
+# Parsed package files are also kept for the daemon
+class PackageRegistry:
+    parsed = LruCache(256)
+
+    def __init__(self):
+        self.packages = {}
+        self.trees = {}
+        self.resolved = {}
+        self.resolving = {}
+        self.clone_options = {}
+        self.lock = threading.RLock()
+
+    def package_key(self, packagepath):
+        package_file = os.path.realpath(Configuration.findpackage(packagepath))
+        return (package_file, os.stat(package_file).st_mtime_ns)
+
+    def load(self, packagepath):
+        key = self.package_key(packagepath)
+        with self.lock:
+            if key not in self.packages:
+                packagejson = PackageRegistry.parsed.get(key[0], key[1])
+                if packagejson is None:
+                    with open(key[0]) as jsonfile:
+                        packagejson = json.load(jsonfile)
+                    PackageRegistry.parsed.put(key[0], key[1], packagejson)
+                self.packages[key] = Configuration(copy.deepcopy(packagejson))
+            return self.packages[key]
+
+    def resolve(self, dependency, sourcedir, releasedir, releaseid):
+        key = (os.path.realpath(sourcedir), dependency.name)
+        with self.lock:
+            if key not in self.resolving:
+                self.resolving[key] = threading.Lock()
+            resolving = self.resolving[key]
+
+        with resolving:
+            with self.lock:
+                resolved = self.resolved.get(key)
+            if resolved is None:
+                dependency(sourcedir, releasedir, releaseid, self.clone_options)
+                with self.lock:
+                    self.resolved[key] = dependency
+            else:
+                dependency.repodir = resolved.repodir
+                dependency.releasedir = os.path.join(releasedir, dependency.name)
+            return dependency
+
+    def tree(self, packagepath):
+        return self.trees.get(self.package_key(packagepath))
+
+    def set_tree(self, packagepath, tree):
+        self.trees[self.package_key(packagepath)] = tree
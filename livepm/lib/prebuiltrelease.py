@@ -0,0 +1,87 @@
+import os
+import json
+import shutil
+import zipfile
+import platform
+import tempfile
+import urllib.parse
+import requests
+
+# Unpacks the -dev release of a dependency from the registry, found like
+# 'livepm dependencies --dev' finds it
+class PrebuiltRelease:
+    server_url = "https://livekeys.io/api/"
+
+    def __init__(self, server_url = None, timeout = 60):
+        self.server_url = server_url if server_url else PrebuiltRelease.server_url
+        if not self.server_url.endswith('/'):
+            self.server_url += '/'
+        self.timeout = timeout
+
+    def platform_name():
+        if platform.system() == 'Darwin':
+            return 'macos-dev'
+        elif platform.system() == 'Windows':
+            return 'win-dev'
+        return 'linux-dev'
+
+    def release_url(self, dependency):
+        urlParams = 'package/' + dependency.name + '/release/' + str(dependency.version) + '/' + PrebuiltRelease.platform_name()
+        return urllib.parse.urljoin(self.server_url, urlParams)
+
+    def marker_path(releasedir):
+        return os.path.join(releasedir, '.livepm', 'prebuilt.json')
+
+    def find(self, dependency):
+        # Returns the registry entry of the release, or None when the registry
+        # has no matching release. Other failures are raised.
+        r = requests.get(self.release_url(dependency), allow_redirects=True, timeout=self.timeout)
+        if r.status_code == 404:
+            return None
+        r.raise_for_status()
+        return json.loads(r.text)
+
+    def __call__(self, dependency, releasedir):
+        release = self.find(dependency)
+        if release is None or 'url' not in release:
+            print('No prebuilt release found for ' + str(dependency) + ' at ' + self.release_url(dependency))
+            return False
+
+        try:
+            with open(PrebuiltRelease.marker_path(releasedir)) as f:
+                if json.load(f).get('url') == release['url']:
+                    print('Prebuilt release of ' + str(dependency) + ' is up to date: \'' + releasedir + '\'')
+                    return True
+        except (OSError, ValueError):
+            pass
+
+        print('Downloading prebuilt release of ' + str(dependency) + ' from ' + release['url'])
+        parentdir = os.path.dirname(os.path.abspath(releasedir))
+        os.makedirs(parentdir, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=parentdir, prefix='.prebuilt-') as tmpdir:
+            archive = os.path.join(tmpdir, 'release.zip')
+            with requests.get(release['url'], stream=True, timeout=self.timeout) as r:
+                r.raise_for_status()
+                with open(archive, 'wb') as f:
+                    for chunk in r.iter_content(chunk_size=1024 * 1024):
+                        f.write(chunk)
+
+            extractdir = os.path.join(tmpdir, 'release')
+            with zipfile.ZipFile(archive) as z:
+                z.extractall(extractdir)
+                # zipfile drops permissions, executables need them back
+                for info in z.infolist():
+                    mode = (info.external_attr >> 16) & 0o777
+                    if mode & 0o111 and not info.is_dir():
+                        os.chmod(os.path.join(extractdir, info.filename), mode)
+
+            os.makedirs(os.path.join(extractdir, '.livepm'), exist_ok=True)
+            with open(os.path.join(extractdir, '.livepm', 'prebuilt.json'), 'w') as f:
+                json.dump({ "url" : release['url'], "version" : release.get('version', str(dependency.version)) }, f, indent=4)
+
+            if os.path.isdir(releasedir):
+                shutil.rmtree(releasedir)
+            os.rename(extractdir, releasedir)
+
+        print('Unpacked prebuilt release of ' + str(dependency) + ' to \'' + releasedir + '\'')
+        return True
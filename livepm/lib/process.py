@@ -1,25 +1,83 @@
 import sys
 import subprocess
 import os
+import threading
+import weakref
 from shutil import which
+from livepm.lib.outputpump import OutputPump
+from livepm.lib.buildtrace import BuildTrace
 
 class Process:
 
-    def run(command, cwd, environment=None, shell=False):
+    children = weakref.WeakSet()
+    children_lock = threading.Lock()
+    usage = threading.local()
+
+    def run(command, cwd, environment=None, shell=False, pass_fds=()):
         proc = subprocess.Popen(
             command, bufsize=1, stdout=subprocess.PIPE, cwd=cwd, shell=shell,
-            stderr=subprocess.STDOUT, universal_newlines=True, env=environment)
+            stderr=subprocess.STDOUT, universal_newlines=True, env=environment, pass_fds=pass_fds)
+        with Process.children_lock:
+            Process.children.add(proc)
         return proc
 
+    def command(proc):
+        return ' '.join(proc.args) if isinstance(proc.args, (list, tuple)) else str(proc.args)
+
+    def name(proc):
+        if isinstance(proc.args, (list, tuple)) and len(proc.args) > 0:
+            return os.path.basename(proc.args[0])
+        return Process.command(proc)
+
+    def terminate_all():
+        with Process.children_lock:
+            running = [proc for proc in Process.children if proc.poll() is None]
+        for proc in running:
+            try:
+                proc.terminate()
+            except OSError:
+                pass
+        return len(running)
+
     def trace(preffix, proc, end='\n'):
-        while proc.poll() is None:
-            line = proc.stdout.readline()
-            if line:
-                print(preffix + line, end=end)
-        line = proc.stdout.readline()
-        while( line ):
-            print(preffix + line, end=end)
-            line = proc.stdout.readline()
+        # Lines are always written with their own line ending, 'end' is kept for
+        # compatibility with existing callers
+        with BuildTrace.span(Process.name(proc), 'process', { "command" : Process.command(proc), "pid" : proc.pid }):
+            pump = OutputPump()
+            pump.add(proc.stdout, preffix)
+            pump.run()
+            return Process.wait(proc)
+
+    def trace_all(traces):
+        pump = OutputPump()
+        for preffix, proc in traces:
+            pump.add(proc.stdout, preffix)
+        pump.run()
+        return [Process.wait(proc) for preffix, proc in traces]
+
+    def wait(proc):
+        # Children are reaped with wait4 where available, so their cpu time and
+        # peak memory can be accounted to the step running on this thread
+        if not hasattr(os, 'wait4') or proc.returncode is not None:
+            return proc.wait()
+        try:
+            pid, status, rusage = os.wait4(proc.pid, 0)
+        except ChildProcessError:
+            return proc.wait()
+        proc.returncode = os.waitstatus_to_exitcode(status)
+
+        # ru_maxrss is in kilobytes, except on macOS where it is in bytes
+        maxrss = rusage.ru_maxrss // 1024 if sys.platform.lower() == 'darwin' else rusage.ru_maxrss
+        Process.usage.cpu = getattr(Process.usage, 'cpu', 0.0) + rusage.ru_utime + rusage.ru_stime
+        Process.usage.maxrss = max(getattr(Process.usage, 'maxrss', 0), maxrss)
+        return proc.returncode
+
+    def reset_usage():
+        Process.usage.cpu = 0.0
+        Process.usage.maxrss = 0
+
+    def collect_usage():
+        return (getattr(Process.usage, 'cpu', 0.0), getattr(Process.usage, 'maxrss', 0))
 
     def exists(name):
         return which(name) is not None
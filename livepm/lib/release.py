@@ -10,7 +10,10 @@ from livepm.lib.releasepopulate import ReleasePopulate
 from livepm.lib.releaselivedoc import ReleaseLiveDoc
 from livepm.lib.releaseqtenvsetup import ReleaseQtEnvSetup
 from livepm.lib.process import Process
+from livepm.lib.jobserver import JobServer
 from livepm.lib.filesystem import FileSystem
+from livepm.lib.directoryindex import DirectoryIndex
+from livepm.lib.copyengine import CopyEngine
 from livepm.lib.winvsenviron import *
 
 
@@ -23,11 +26,24 @@ class ReleaseMake(ReleaseAction):
 
     def __call__(self, sourcedir, releasedir, environment = os.environ):
         start = time.time()
-        proc = Process.run([self.makecommand] + self.options, self.run_dir(releasedir), environment)
-        Process.trace('MAKE: ', proc, end='')
+        jobserver = JobServer.active
+        if jobserver is None:
+            proc = Process.run([self.makecommand] + self.options, self.run_dir(releasedir), environment)
+            exitcode = Process.trace('MAKE: ', proc, end='')
+        else:
+            # The token stands for the job slot make always has for itself
+            token = jobserver.acquire()
+            try:
+                proc = Process.run(
+                    [self.makecommand] + self.options, self.run_dir(releasedir),
+                    jobserver.environment(environment), pass_fds=jobserver.fds())
+                exitcode = Process.trace('MAKE: ', proc, end='')
+            finally:
+                jobserver.release(token)
         end = time.time()
 
         print('Make - Time Elapsed:' + str(end - start))
+        return exitcode
 
 class ReleaseNMake(ReleaseAction):
 
@@ -39,7 +55,7 @@ class ReleaseNMake(ReleaseAction):
     def __call__(self, sourcedir, releasedir, environment = os.environ):
         VSEnvironment.setupenv(142, 'x86_amd64')
         proc = Process.run([self.makecommand] + self.options, self.run_dir(releasedir), environment)
-        Process.trace('MAKE: ', proc, end='')
+        return Process.trace('MAKE: ', proc, end='')
 
 class ReleaseQmake(ReleaseAction):
 
@@ -50,26 +66,78 @@ class ReleaseQmake(ReleaseAction):
             os.environ['QTDIR'],
             'bin/qmake' + ('.exe' if platform.system().lower() == 'windows' else ''))
 
+    def config_path(self, releasedir):
+        return os.path.join(self.run_dir(releasedir), 'config.pri')
+
+    def config_assignments(self, releasedir):
+        # The build configuration generated by the builder lives in the release
+        # dir. Projects include it from their .qmake.conf, and it's also given
+        # to qmake as command line assignments
+        try:
+            with open(self.config_path(releasedir)) as f:
+                return [line.strip() for line in f if line.strip()]
+        except OSError:
+            return []
+
     def __call__(self, sourcedir, releasedir, environment = os.environ):
         if platform.system().lower() == 'windows':
             VSEnvironment.setupenv(142, 'x86_amd64')
-        proc = Process.run([self.qmakecommand] + self.options + [os.path.abspath(sourcedir)], self.run_dir(releasedir), environment)
-        Process.trace('QMAKE: ', proc, end='')
+        proc = Process.run(
+            [self.qmakecommand] + self.options + self.config_assignments(releasedir) + [os.path.abspath(sourcedir)],
+            self.run_dir(releasedir), environment)
+        return Process.trace('QMAKE: ', proc, end='')
+
+    def inputs(self, sourcedir, releasedir, environment = os.environ):
+        projectfiles = [self.qmakecommand, self.config_path(releasedir)]
+        skip = [os.path.abspath(self.run_dir(releasedir)), os.path.dirname(os.path.abspath(self.run_dir(releasedir)))]
+        skip = [path for path in skip if path != os.path.abspath(sourcedir)]
+        for root, dirs, files in DirectoryIndex.walk(sourcedir):
+            dirs[:] = [d for d in dirs if d != '.git' and os.path.join(root, d) not in skip]
+            for file in files:
+                if file.endswith(('.pro', '.pri', '.prf')) or file in ('.qmake.conf', '.qmake.cache'):
+                    projectfiles.append(os.path.join(root, file))
+        return projectfiles
+
+    def outputs(self, sourcedir, releasedir, environment = os.environ):
+        return [os.path.join(self.run_dir(releasedir), 'Makefile')]
 
 class ReleaseCopy(ReleaseAction):
     def __init__(self, parent, step, options = None):
         super().__init__('copy', parent, step)
         self.options = options
 
-    def __call__(self, sourcedir, releasedir, environment = os.environ):
+    def structure_paths(self, sourcedir, releasedir, environment):
         structurepaths = {}
         for key, value in self.parent.environment.items():
             structurepaths[value] = environment[key]
 
         structurepaths['source']  = sourcedir
         structurepaths['release'] = releasedir
+        return structurepaths
+
+    def targets(self, sourcedir, releasedir, environment):
+        entries = FileSystem.structureEntries(
+            self.run_dir(releasedir), self.options, self.structure_paths(sourcedir, releasedir, environment))
+        targets = []
+        for src, dst in entries:
+            targets += FileSystem.copyTargets(src, dst)
+        return targets
 
-        FileSystem.copyFileStructure(self.run_dir(releasedir), self.options, structurepaths)
+    def manifest_path(self, releasedir):
+        steps = self.parent.buildsteps if self.step == 'build' else self.parent.deploysteps
+        index = next(i for i, step in enumerate(steps) if step is self)
+        return os.path.join(releasedir, '.livepm', 'copy', self.step + '-' + str(index) + '.json')
+
+    def __call__(self, sourcedir, releasedir, environment = os.environ):
+        engine = CopyEngine(manifest=self.manifest_path(releasedir))
+        engine.add_structure(self.run_dir(releasedir), self.options, self.structure_paths(sourcedir, releasedir, environment))
+        engine()
+
+    def inputs(self, sourcedir, releasedir, environment = os.environ):
+        return [src for src, dst in self.targets(sourcedir, releasedir, environment)]
+
+    def outputs(self, sourcedir, releasedir, environment = os.environ):
+        return [dst for src, dst in self.targets(sourcedir, releasedir, environment)]
 
 class ReleaseRun(ReleaseAction):
     def __init__(self, parent, step, options = None):
@@ -79,7 +147,7 @@ class ReleaseRun(ReleaseAction):
     def __call__(self, sourcedir, releasedir, environment = os.environ):
         print('RUN:' + str(self.options))
         proc = Process.run([] + self.options, self.run_dir(releasedir), environment)
-        Process.trace('RUN: ', proc, end='')
+        return Process.trace('RUN: ', proc, end='')
 
 class ReleaseWrite(ReleaseAction):
     def __init__(self, parent, step, options = None):
@@ -95,10 +163,18 @@ class ReleaseWrite(ReleaseAction):
             writedata = self.options['data']
 
         print('WRITE: File \'' + filepath + '\'')
+        if os.path.lexists(filepath):
+            os.remove(filepath)
         f = open(filepath, 'w')
         f.write(writedata)
         f.close()
 
+    def inputs(self, sourcedir, releasedir, environment = os.environ):
+        return []
+
+    def outputs(self, sourcedir, releasedir, environment = os.environ):
+        return [os.path.join(self.run_dir(releasedir), self.options['file'])]
+
 class Release:
     def __init__(self, name, version, releaseid, opt):
         self.id = releaseid
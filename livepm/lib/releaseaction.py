@@ -19,5 +19,15 @@ class ReleaseAction:
 
             return deploydirroot
 
+    # Actions that can be skipped when nothing changed declare the paths they read
+    # and the paths they produce. Returning None from either marks the action as
+    # one that always has to run.
+
+    def inputs(self, sourcedir, releasedir, environment = os.environ):
+        return None
+
+    def outputs(self, sourcedir, releasedir, environment = os.environ):
+        return None
+
     def __str__(self):
         return self.name
@@ -1,32 +1,103 @@
 import os
-import shutil
-import fnmatch
+import concurrent.futures
 
 from livepm.lib.releaseaction import *
+from livepm.lib.globmatcher import GlobMatcher
 
+# Nothing below a matching directory is matched again. With dry_run set,
+# matches are only listed with their size
 class ReleaseClean(ReleaseAction):
+    # Set by deploy --clean-dry-run
+    dry_run = False
+    jobs = min(32, os.cpu_count() or 1)
 
     def __init__(self, parent, step, options = None):
         super().__init__('clean', parent, step)
         self.options = options
 
     def __call__(self, sourcedir, releasedir, environment = os.environ):
+        # Entries to remove, in dicts to drop the ones found through several keys
+        files = {}
+        dirs = {}
+        matches = {}
         for key, value in self.options.items():
             if not os.path.isabs(key):
                 key = os.path.join(self.run_dir(releasedir), key)
-            for subdir, dirs, files in os.walk(key):
-                if ReleaseClean.is_match(subdir, value):
-                    shutil.rmtree(subdir)
-                    print('CLEAN: Removed ' + subdir)
-                else:    
-                    for file in files:
-                        filepath = os.path.join(subdir, file)
-                        if ReleaseClean.is_match(filepath, value):
-                            os.remove(filepath)
-                            print('CLEAN: Removed ' + filepath)
+            ReleaseClean.collect(key, GlobMatcher(value), files, dirs, matches)
+
+        if ReleaseClean.dry_run:
+            for path, size in sorted(matches.items()):
+                print('CLEAN: Would remove ' + path + ' (' + ReleaseClean.format_size(size) + ')')
+            print(
+                'CLEAN: Would remove ' + str(len(files)) + ' files and ' + str(len(dirs)) + ' directories, reclaiming ' +
+                ReleaseClean.format_size(sum(matches.values())))
+            return
+
+        # Files are unlinked in batches of one directory, which threads then
+        # don't contend for. A single core is faster unlinking on its own
+        batches = {}
+        for path in files:
+            batches.setdefault(os.path.dirname(path), []).append(path)
+        jobs = min(ReleaseClean.jobs, len(batches))
+        if jobs > 1:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+                for batch in executor.map(ReleaseClean.remove, batches.values()):
+                    pass
+        else:
+            for batch in batches.values():
+                ReleaseClean.remove(batch)
+        for path in sorted(dirs, reverse=True):
+            os.rmdir(path)
+        for path in sorted(matches):
+            print('CLEAN: Removed ' + path)
+
+    def collect(top, matcher, files, dirs, matches):
+        # Adds the entries to remove below top. Each one is kept with the
+        # matching path it's removed with, whose size is only counted for
+        # dry runs
+        if not os.path.isdir(top) or os.path.islink(top):
+            return
+        stack = [(top, top if matcher.matches(top) else None)]
+        while stack:
+            path, match = stack.pop()
+            if match is not None:
+                dirs[path] = match
+                matches.setdefault(match, 0)
+            try:
+                with os.scandir(path) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    isdir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    isdir = False
+                if isdir:
+                    stack.append((entry.path, match if match is not None or not matcher.matches(entry.path) else entry.path))
+                    continue
+                filematch = match if match is not None or not matcher.matches(entry.path) else entry.path
+                if filematch is None or entry.path in files:
+                    continue
+                files[entry.path] = filematch
+                matches.setdefault(filematch, 0)
+                if ReleaseClean.dry_run:
+                    try:
+                        matches[filematch] += entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        pass
+
+    def remove(batch):
+        for path in batch:
+            os.remove(path)
+        return batch
+
+    def format_size(size):
+        if size >= 1024 * 1024:
+            return '{:.1f}'.format(size / (1024 * 1024)) + 'MB'
+        if size >= 1024:
+            return '{:.1f}'.format(size / 1024) + 'KB'
+        return str(size) + 'B'
 
     def is_match(name, values):
-        for value in values:
-            if ( fnmatch.fnmatch(name, value) ):
-                return True
-        return False
\ No newline at end of file
+        return GlobMatcher.compile(tuple(values)).matches(name)
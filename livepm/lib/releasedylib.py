@@ -1,12 +1,12 @@
 import os
 import platform
-import fnmatch
 
 from time import sleep
 
 from livepm.lib.process import Process
 from livepm.lib.releaseaction import ReleaseAction
 from livepm.lib.filesystem import FileSystem
+from livepm.lib.globmatcher import GlobMatcher
 from livepm.lib.dylibdependencies import DylibDependencyTransfer
 
 class ReleaseDylibAddRPath(ReleaseAction):
@@ -25,6 +25,7 @@ class ReleaseDylibAddRPath(ReleaseAction):
             entries = FileSystem.listEntries(key)
             for entry in entries:
                 if not os.path.islink(entry):
+                    FileSystem.breakLink(entry)
                     for rpath in value:
                         intproc = Process.run(
                             ['install_name_tool', '-add_rpath', rpath, entry], 
@@ -47,6 +48,7 @@ class ReleaseDylibRelink(ReleaseAction):
             if not os.path.isabs(key):
                 key = os.path.join(self.run_dir(releasedir), key)
 
+            FileSystem.breakLink(key)
             proc = Process.run(['otool', '-L', key], self.run_dir(releasedir))
             collect = []
 
@@ -62,30 +64,33 @@ class ReleaseDylibRelink(ReleaseAction):
 
             header_was_printed = False
 
+            # A dependency is changed once, by the first pattern matching it
+            matcher = GlobMatcher(value)
             for l in collect:
-                for liboldpattern, libnewvalue in value.items():
-                    if ( fnmatch.fnmatch(l, liboldpattern) ):
-                        libname = l
-                        libnameidx = l.rfind('/')
-                        if libnameidx != -1:
-                            libname = l[libnameidx:]
-                        
-                        if libnewvalue == '-':
-                            libnewvalue = libname
-                        elif libnewvalue.endswith('/-'):
-                            libnewvalue = libnewvalue[0:-2] + libname
-
-                        if not header_was_printed:
-                            print('Dylib: ' + key + ':')
-                            header_was_printed = True
-                        print('Dylib:    ' + l + ' -> ' + libnewvalue)
-
-                        # install_name_tool -change /usr/local/opt/opencv/lib/libopencv_core.3.3.dylib @rpath/OpenCV.framework/Libraries/libopencv_core.3.3.dylib liblcvcore.dylib
-                        intproc = Process.run(
-                            ['install_name_tool', '-change', l, libnewvalue, key], 
-                            self.run_dir(releasedir)
-                        )
-                        Process.trace('Dylib Link: ', intproc)
+                liboldpattern = matcher.match(l)
+                if liboldpattern is not None:
+                    libnewvalue = value[liboldpattern]
+                    libname = l
+                    libnameidx = l.rfind('/')
+                    if libnameidx != -1:
+                        libname = l[libnameidx:]
+                    
+                    if libnewvalue == '-':
+                        libnewvalue = libname
+                    elif libnewvalue.endswith('/-'):
+                        libnewvalue = libnewvalue[0:-2] + libname
+
+                    if not header_was_printed:
+                        print('Dylib: ' + key + ':')
+                        header_was_printed = True
+                    print('Dylib:    ' + l + ' -> ' + libnewvalue)
+
+                    # install_name_tool -change /usr/local/opt/opencv/lib/libopencv_core.3.3.dylib @rpath/OpenCV.framework/Libraries/libopencv_core.3.3.dylib liblcvcore.dylib
+                    intproc = Process.run(
+                        ['install_name_tool', '-change', l, libnewvalue, key], 
+                        self.run_dir(releasedir)
+                    )
+                    Process.trace('Dylib Link: ', intproc)
 
     def addLine(collect, line):
         try:
@@ -26,5 +26,5 @@ class ReleaseLiveDoc(ReleaseAction):
             return
 
         proc = Process.run(['node', os.environ['LIVEDOC'], '--deploy', deploy_to, os.path.abspath(sourcedir)], os.path.dirname(os.environ['LIVEDOC']), environment)
-        Process.trace('LIVEDOC: ', proc, end='')
+        return Process.trace('LIVEDOC: ', proc, end='')
         # print("Livedoc ready.")
@@ -1,9 +1,9 @@
 import os
 import shutil
-import fnmatch
 import json
 
 from livepm.lib.releaseaction import *
+from livepm.lib.globmatcher import GlobMatcher
 
 class ReleasePopulate(ReleaseAction):
 
@@ -27,11 +27,10 @@ class ReleasePopulate(ReleaseAction):
                 print("         * " + populatekey + ' -> ' + populatevalue)
                 fdata[populatekey] = populatevalue
 
+            if os.path.lexists(key):
+                os.remove(key)
             with open(key, 'w') as fw:
                 json.dump(fdata, fw, indent=4)
 
     def is_match(name, values):
-        for value in values:
-            if ( fnmatch.fnmatch(name, value) ):
-                return True
-        return False
\ No newline at end of file
+        return GlobMatcher.compile(tuple(values)).matches(name)
\ No newline at end of file
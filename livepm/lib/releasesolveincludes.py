@@ -29,6 +29,10 @@ class ReleaseSolveIncludesItem:
                     sourcefile = ReleaseSolveIncludesItem.find(filename, sourcepath)
                     if ( sourcefile is not None ):
                         sourcefilepath = os.path.join(sourcepath, filename)
+                        # Replaced rather than written to, since deploy --link
+                        # may have staged it as a hardlink
+                        if os.path.lexists(os.path.join(absto, filename)):
+                            os.remove(os.path.join(absto, filename))
                         shutil.copyfile(sourcefilepath, os.path.join(absto, filename))
                         # print('Includes: Solved \'' + sourcefilepath + '\'')
                         filefound = True
@@ -41,20 +45,34 @@ class ReleaseSolveIncludesItem:
 class ReleaseSolveIncludes(ReleaseAction):
     def __init__(self, parent, step, options = None):
         super().__init__('solveincludes', parent, step)
+        self.options = options
         self.items = []
         for value in options:
             self.items.append(ReleaseSolveIncludesItem(
                 self, value['from'], value['to'], value['source']
             ))
 
-    def __call__(self, sourcedir, releasedir, environment = os.environ):
-
+    def structure_paths(self, sourcedir, releasedir, environment):
         structurepaths = {}
         for key, value in self.parent.environment.items():
             structurepaths[value] = environment[key]
 
         structurepaths['source']  = sourcedir
         structurepaths['release'] = releasedir
+        return structurepaths
 
+    def __call__(self, sourcedir, releasedir, environment = os.environ):
+        structurepaths = self.structure_paths(sourcedir, releasedir, environment)
         for item in self.items:
             item(releasedir, structurepaths)
+
+    def inputs(self, sourcedir, releasedir, environment = os.environ):
+        structurepaths = self.structure_paths(sourcedir, releasedir, environment)
+        paths = []
+        for item in self.items:
+            paths.append(item.include.format_map(structurepaths))
+            paths += [sourcepath.format_map(structurepaths) for sourcepath in item.source]
+        return paths
+
+    def outputs(self, sourcedir, releasedir, environment = os.environ):
+        return [os.path.join(self.run_dir(releasedir), item.to) for item in self.items]
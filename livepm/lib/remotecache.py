@@ -0,0 +1,124 @@
+import os
+import re
+import shutil
+import tarfile
+import hashlib
+import tempfile
+import http.client
+import urllib.error
+import urllib.request
+
+from livepm.lib.artifactstore import ArtifactStore
+
+# Client of an HTTP artifact cache, see remotecacheserver.py. Transfers are
+# checked against X-Content-SHA256, and failures count as misses
+class RemoteCache:
+    hash_header = 'X-Content-SHA256'
+
+    def __init__(self, url, timeout = 60):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def default_url():
+        return os.environ.get('LIVEPM_REMOTE_CACHE')
+
+    def artifact_url(self, key):
+        if not re.match(r'^[0-9a-f]{64}$', key):
+            raise ValueError('Invalid artifact key: ' + key)
+        return self.url + '/artifacts/' + key + '.tar.gz'
+
+    def get(self, key, releasedir):
+        try:
+            return self.download(key, releasedir)
+        except urllib.error.HTTPError as e:
+            if e.code != 404:
+                print('Remote cache: failed to get ' + key[:12] + ': ' + str(e))
+        except (OSError, http.client.HTTPException, ValueError, tarfile.TarError) as e:
+            print('Remote cache: failed to get ' + key[:12] + ': ' + str(e))
+        return False
+
+    def put(self, key, releasedir):
+        try:
+            self.upload(key, releasedir)
+            return True
+        except (OSError, http.client.HTTPException, ValueError, tarfile.TarError) as e:
+            print('Remote cache: failed to put ' + key[:12] + ': ' + str(e))
+        return False
+
+    def download(self, key, releasedir):
+        parentdir = os.path.dirname(os.path.abspath(releasedir))
+        os.makedirs(parentdir, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=parentdir, prefix='.remotecache-') as tmpdir:
+            archive = os.path.join(tmpdir, 'artifact.tar.gz')
+            h = hashlib.sha256()
+            with urllib.request.urlopen(self.artifact_url(key), timeout=self.timeout) as response:
+                expected = response.headers.get(RemoteCache.hash_header)
+                with open(archive, 'wb') as f:
+                    while True:
+                        chunk = response.read(1024 * 1024)
+                        if not chunk:
+                            break
+                        h.update(chunk)
+                        f.write(chunk)
+
+            if expected is None or h.hexdigest() != expected.lower():
+                raise ValueError('integrity check failed for ' + key[:12])
+            size = os.path.getsize(archive)
+
+            extractdir = os.path.join(tmpdir, 'release')
+            with tarfile.open(archive, 'r:gz') as tar:
+                RemoteCache.extract(tar, extractdir)
+
+            if os.path.isdir(releasedir):
+                shutil.rmtree(releasedir)
+            os.rename(extractdir, releasedir)
+
+        print('Remote cache: downloaded ' + key[:12] + ' (' + '{:.1f}'.format(size / (1024 * 1024)) + 'MB)')
+        return True
+
+    def upload(self, key, releasedir):
+        with tempfile.TemporaryDirectory(prefix='livepm-remotecache-') as tmpdir:
+            archive = os.path.join(tmpdir, 'artifact.tar.gz')
+            with tarfile.open(archive, 'w:gz') as tar:
+                for name in sorted(os.listdir(releasedir)):
+                    if name != '.livepm':
+                        tar.add(os.path.join(releasedir, name), arcname=name)
+                portable = ArtifactStore.portable_dir(releasedir)
+                if os.path.isdir(portable):
+                    tar.add(portable, arcname='.livepm/portable')
+
+            h = hashlib.sha256()
+            with open(archive, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    h.update(chunk)
+
+            size = os.path.getsize(archive)
+            with open(archive, 'rb') as f:
+                request = urllib.request.Request(self.artifact_url(key), data=f, method='PUT', headers={
+                    'Content-Type' : 'application/gzip',
+                    'Content-Length' : str(size),
+                    RemoteCache.hash_header : h.hexdigest()
+                })
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    response.read()
+
+        print('Remote cache: uploaded ' + key[:12] + ' (' + '{:.1f}'.format(size / (1024 * 1024)) + 'MB)')
+
+    def extract(tar, path):
+        # Members must stay inside the target dir, and links must point inside it
+        root = os.path.realpath(path)
+        for member in tar.getmembers():
+            target = os.path.realpath(os.path.join(root, member.name))
+            if target != root and not target.startswith(root + os.sep):
+                raise ValueError('unsafe path in artifact: ' + member.name)
+            if member.issym() or member.islnk():
+                linkbase = os.path.dirname(target) if member.issym() else root
+                linktarget = os.path.realpath(os.path.join(linkbase, member.linkname))
+                if linktarget != root and not linktarget.startswith(root + os.sep):
+                    raise ValueError('unsafe link in artifact: ' + member.name)
+            if not (member.isfile() or member.isdir() or member.issym() or member.islnk()):
+                raise ValueError('unsupported member in artifact: ' + member.name)
+        if hasattr(tarfile, 'tar_filter'):
+            tar.extractall(path, filter='tar')
+        else:
+            tar.extractall(path)
@@ -0,0 +1,148 @@
+import os
+import re
+import sys
+import hashlib
+import argparse
+import tempfile
+import threading
+import http.server
+
+# Stores an upload only when it matches its X-Content-SHA256, and keeps the
+# first upload of a key
+class RemoteCacheHandler(http.server.BaseHTTPRequestHandler):
+    path_pattern = re.compile(r'^/artifacts/([0-9a-f]{64})\.tar\.gz$')
+    hash_header = 'X-Content-SHA256'
+
+    def artifact(self):
+        match = RemoteCacheHandler.path_pattern.match(self.path)
+        if not match:
+            self.send_error(404)
+            return None
+        return os.path.join(self.server.storedir, match.group(1) + '.tar.gz')
+
+    def do_HEAD(self):
+        self.send_artifact(False)
+
+    def do_GET(self):
+        self.send_artifact(True)
+
+    def send_artifact(self, body):
+        path = self.artifact()
+        if path is None:
+            return
+        try:
+            with open(path + '.sha256') as f:
+                digest = f.read().strip()
+            f = open(path, 'rb')
+        except OSError:
+            self.send_error(404)
+            return
+        with f:
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/gzip')
+            self.send_header('Content-Length', str(os.fstat(f.fileno()).st_size))
+            self.send_header(RemoteCacheHandler.hash_header, digest)
+            self.end_headers()
+            if body:
+                while True:
+                    chunk = f.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+
+    def intact(path):
+        try:
+            with open(path + '.sha256') as f:
+                digest = f.read().strip()
+            h = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    h.update(chunk)
+        except OSError:
+            return False
+        return h.hexdigest() == digest
+
+    def do_PUT(self):
+        path = self.artifact()
+        if path is None:
+            return
+        expected = self.headers.get(RemoteCacheHandler.hash_header)
+        length = self.headers.get('Content-Length')
+        if expected is None or length is None:
+            self.send_error(400, 'Content-Length and ' + RemoteCacheHandler.hash_header + ' are required')
+            return
+        length = int(length)
+        if length > self.server.maxsize:
+            self.send_error(413)
+            return
+
+        h = hashlib.sha256()
+        fd, tmppath = tempfile.mkstemp(dir=self.server.storedir, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                remaining = length
+                while remaining > 0:
+                    chunk = self.rfile.read(min(remaining, 1024 * 1024))
+                    if not chunk:
+                        break
+                    h.update(chunk)
+                    f.write(chunk)
+                    remaining -= len(chunk)
+            if remaining > 0 or h.hexdigest() != expected.lower():
+                os.remove(tmppath)
+                self.send_error(400, 'Integrity check failed')
+                return
+
+            # The digest is written last, and artifacts are only served once it
+            # exists, so an artifact is never served with a digest of another upload
+            with self.server.lock:
+                if RemoteCacheHandler.intact(path):
+                    os.remove(tmppath)
+                    status = 200
+                else:
+                    if os.path.exists(path + '.sha256'):
+                        os.remove(path + '.sha256')
+                    os.replace(tmppath, path)
+                    with open(path + '.sha256.tmp', 'w') as f:
+                        f.write(h.hexdigest())
+                    os.replace(path + '.sha256.tmp', path + '.sha256')
+                    status = 201
+        except OSError:
+            if os.path.exists(tmppath):
+                os.remove(tmppath)
+            raise
+
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+class RemoteCacheServer(http.server.ThreadingHTTPServer):
+
+    def __init__(self, address, storedir, maxsize = 16 * 1024 * 1024 * 1024):
+        super().__init__(address, RemoteCacheHandler)
+        self.storedir = os.path.abspath(storedir)
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        os.makedirs(self.storedir, exist_ok=True)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Serve a remote build cache for livepm.')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on.')
+    parser.add_argument('--port', '-p', type=int, default=8765, help='Port to listen on.')
+    parser.add_argument('--dir', '-d', default='livepm-cache', help='Directory to store artifacts in.')
+    args = parser.parse_args(argv)
+
+    server = RemoteCacheServer((args.host, args.port), args.dir)
+    print('Serving livepm remote cache from \'' + server.storedir + '\' on http://' + args.host + ':' + str(server.server_address[1]))
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
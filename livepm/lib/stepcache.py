@@ -0,0 +1,87 @@
+import os
+import json
+import hashlib
+
+from livepm.lib.filesystem import FileSystem
+
+# Skips a step whose options, inputs and environment hash the same as in its
+# last successful run, while its outputs are still the ones it produced
+class StepCache:
+    # Small files (configuration, project files) are hashed by content, since
+    # they are often rewritten with the same data. Larger ones by size and mtime.
+    content_hash_limit = 64 * 1024
+
+    def __init__(self, releasedir):
+        self.path = os.path.join(releasedir, '.livepm', 'stepcache.json')
+        self.entries = {}
+        self.results = []
+        try:
+            with open(self.path) as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def hash_path(path):
+        if os.path.isdir(path):
+            return 'dir:' + FileSystem.hashTree(path)
+        if not os.path.exists(path):
+            return 'missing'
+        st = os.stat(path)
+        if st.st_size > StepCache.content_hash_limit:
+            return 'stat:' + str(st.st_size) + ':' + str(st.st_mtime_ns)
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            h.update(f.read())
+        return 'file:' + h.hexdigest()
+
+    def key(self, action, sourcedir, releasedir, environment):
+        inputs = action.inputs(sourcedir, releasedir, environment)
+        if inputs is None or action.outputs(sourcedir, releasedir, environment) is None:
+            return None
+
+        values = {}
+        for key in sorted(action.parent.environment):
+            values[key] = environment.get(key, '')
+
+        data = {
+            "type" : action.name,
+            "options" : getattr(action, 'options', None),
+            "inputs" : [[path, StepCache.hash_path(path)] for path in sorted(set(inputs))],
+            "environment" : values,
+            "sourcedir" : sourcedir,
+            "releasedir" : releasedir
+        }
+        return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    def outputs_key(self, action, sourcedir, releasedir, environment):
+        outputs = action.outputs(sourcedir, releasedir, environment)
+        data = [[path, StepCache.hash_path(path)] for path in sorted(set(outputs))]
+        return hashlib.sha256(json.dumps(data).encode('utf-8')).hexdigest()
+
+    def is_fresh(self, name, key, action, sourcedir, releasedir, environment):
+        if key is None or name not in self.entries or self.entries[name]['key'] != key:
+            return False
+        for path in action.outputs(sourcedir, releasedir, environment):
+            if not os.path.exists(path):
+                return False
+        return self.entries[name].get('outputs') == self.outputs_key(action, sourcedir, releasedir, environment)
+
+    def store(self, name, key, action, outputs):
+        self.entries[name] = { "key" : key, "type" : action.name, "outputs" : outputs }
+
+    def record(self, name, action, hit):
+        self.results.append((name, action.name, hit))
+
+    def save(self):
+        if not os.path.exists(os.path.dirname(self.path)):
+            os.makedirs(os.path.dirname(self.path))
+        with open(self.path, 'w') as f:
+            json.dump(self.entries, f, indent=4)
+
+    def report(self):
+        hits = len([r for r in self.results if r[2] is True])
+        misses = len([r for r in self.results if r[2] is False])
+        print('\nStep cache: ' + str(hits) + ' hits, ' + str(misses) + ' misses, ' + str(len(self.results) - hits - misses) + ' uncached')
+        for name, actionname, hit in self.results:
+            status = 'hit' if hit is True else ('miss' if hit is False else 'uncached')
+            print('   * ' + name + ' (' + actionname + '): ' + status)
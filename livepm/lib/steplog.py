@@ -0,0 +1,36 @@
+import os
+import gzip
+import collections
+
+# Gzipped log of a step in quiet mode, keeping the last lines for failures
+class StepLog:
+    def __init__(self, path, tail = 100):
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        self.path = path
+        self.file = gzip.open(path, 'wt', encoding='utf-8', errors='replace', compresslevel=6)
+        self.lines = collections.deque(maxlen=tail)
+        self.pending = ''
+
+    def write(self, text):
+        self.file.write(text)
+        data = self.pending + text
+        lastnewline = data.rfind('\n')
+        if lastnewline == -1:
+            self.pending = data
+        else:
+            self.pending = data[lastnewline + 1:]
+            self.lines.extend(data[:lastnewline].split('\n'))
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def tail(self):
+        lines = list(self.lines)
+        if self.pending:
+            lines.append(self.pending)
+        return lines
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,152 @@
+import os
+import time
+
+from livepm.lib.steplog import StepLog
+from livepm.lib.buildoutput import BuildOutput
+from livepm.lib.buildtrace import BuildTrace
+from livepm.lib.buildstats import BuildStats
+from livepm.lib.process import Process
+
+class StepResult:
+    def __init__(self, name, action, exitcode, duration, error = None, cached = False):
+        self.name = name
+        self.action = action
+        self.exitcode = exitcode
+        self.duration = duration
+        self.error = error
+        self.cached = cached
+        self.cpu = 0.0
+        self.child_cpu = 0.0
+        self.maxrss = 0
+
+    def ok(self):
+        return self.error is None and self.exitcode == 0
+
+    def __str__(self):
+        release = self.action.parent
+        s = 'step \'' + str(self.action) + '\' (' + self.name + ') of ' + release.name + ' [' + release.id + ']'
+        if self.error is not None:
+            s += ' failed with error: ' + str(self.error)
+        elif self.exitcode != 0:
+            s += ' exited with code ' + str(self.exitcode)
+        else:
+            s += ' succeeded'
+        return s + ' after ' + '{:.1f}'.format(self.duration) + 's'
+
+
+class StepError(Exception):
+    def __init__(self, result):
+        super().__init__(str(result))
+        self.result = result
+
+
+# Runs the steps of a release, stopping at the first failure with a
+# StepError. Up to date steps are skipped through the step cache, and
+# steps before 'start' through the checkpoint
+class StepRunner:
+    def __init__(self, release, step, cache = None, quiet = False, tail = 100):
+        self.release = release
+        self.step = step
+        self.cache = cache
+        self.quiet = quiet
+        self.tail = tail
+        self.results = []
+        self.cancelled = None
+        self.stats = BuildStats()
+        self.checkpoint = None
+        self.run_id = None
+        self.start = 0
+
+    def log_path(self, releasedir, index, action):
+        return os.path.join(releasedir, '.livepm', 'logs', self.step + '-' + str(index).zfill(2) + '-' + action.name + '.log.gz')
+
+    def __call__(self, actions, sourcedir, releasedir, environment = os.environ):
+        try:
+            return self.run_steps(actions, sourcedir, releasedir, environment)
+        finally:
+            if self.stats:
+                self.stats.record(self.release, self.step, self.results)
+
+    def run_steps(self, actions, sourcedir, releasedir, environment):
+        for index, action in enumerate(actions):
+            if self.cancelled is not None and self.cancelled.is_set():
+                raise Exception("Cancelled before " + self.step + " step " + str(index) + " of " + self.release.name)
+
+            name = self.step + ':' + str(index)
+            title = str(action).upper() if self.step == 'deploy' else str(action)
+            if index < self.start:
+                print((' * ' + title + ': ' if self.quiet else '\n *** ' + title + ' *** \n\n') + 'Completed in a previous run, skipping.')
+                continue
+
+            if not self.quiet:
+                print('\n *** ' + title + ' *** \n')
+
+            key = None
+            if self.cache:
+                key = self.cache.key(action, sourcedir, releasedir, environment)
+                if self.cache.is_fresh(name, key, action, sourcedir, releasedir, environment):
+                    print((' * ' + title + ': ' if self.quiet else '') + 'Up to date, skipping.')
+                    self.cache.record(name, action, True)
+                    self.results.append(StepResult(name, action, 0, 0.0, cached=True))
+                    self.save_checkpoint(index + 1)
+                    continue
+
+            if self.quiet:
+                result = self.run_quiet(name, action, title, self.log_path(releasedir, index, action), sourcedir, releasedir, environment)
+            else:
+                result = self.run(name, action, sourcedir, releasedir, environment)
+            self.results.append(result)
+
+            if not result.ok():
+                raise StepError(result) from result.error
+
+            if self.cache:
+                if key is not None:
+                    self.cache.store(name, key, action, self.cache.outputs_key(action, sourcedir, releasedir, environment))
+                    self.cache.save()
+                self.cache.record(name, action, False if key is not None else None)
+            self.save_checkpoint(index + 1)
+
+        if self.cache and not self.quiet:
+            self.cache.report()
+        return self.results
+
+    def save_checkpoint(self, completed):
+        if self.checkpoint:
+            self.checkpoint.save(self.run_id, completed)
+
+    def run(self, name, action, sourcedir, releasedir, environment):
+        Process.reset_usage()
+        start = time.time()
+        cpustart = time.thread_time()
+        try:
+            with BuildTrace.span(str(action), 'step', { "step" : name }):
+                exitcode = action(sourcedir, releasedir, environment)
+            result = StepResult(name, action, exitcode if exitcode is not None else 0, time.time() - start)
+        except Exception as e:
+            result = StepResult(name, action, None, time.time() - start, e)
+        result.cpu = time.thread_time() - cpustart
+        result.child_cpu, result.maxrss = Process.collect_usage()
+        return result
+
+    def run_quiet(self, name, action, title, logpath, sourcedir, releasedir, environment):
+        log = StepLog(logpath, self.tail)
+        output = BuildOutput.install()
+        try:
+            output.capture(log)
+            result = self.run(name, action, sourcedir, releasedir, environment)
+            if result.error is not None:
+                print('Error: ' + str(result.error))
+        finally:
+            output.release()
+            BuildOutput.uninstall()
+            log.close()
+
+        elapsed = '{:.1f}'.format(result.duration)
+        if not result.ok():
+            print(' * ' + title + ': failed after ' + elapsed + 's, log: ' + logpath)
+            for line in log.tail():
+                print('   | ' + line)
+        else:
+            print(' * ' + title + ': done in ' + elapsed + 's')
+        return result
@@ -6,9 +6,11 @@ import argparse
 path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, path)
 
-from livepm.commands import stored_commands
+from livepm.lib.daemon import Daemon
 
-def main(argv):
+def run(argv):
+    # Commands are imported here, so forwarding to a daemon doesn't pay for them
+    from livepm.commands import stored_commands
 
     command = 'help'
     if ( len(argv) > 0 and (argv[0] in stored_commands) ):
@@ -18,5 +20,12 @@ def main(argv):
     command_object.parse_args(argv[1:])
     command_object()
 
+def main(argv):
+    if len(argv) == 0 or argv[0] != 'daemon':
+        exitcode = Daemon.forward(argv)
+        if exitcode is not None:
+            sys.exit(exitcode)
+    run(argv)
+
 if __name__ == "__main__":
     main(sys.argv[1:])
@@ -33,5 +33,7 @@ PROJECT_ROOT = $$PWD
 BUILD_DEPENDENCIES = true
 DEPLOY_TO_LIVEKEYS = true
 
+# livepm writes the build configuration to the release dir, which is the shadowed dir of this one
 exists($$PWD/config.pri):include($$PWD/config.pri)
+exists($$shadowed($$PWD)/config.pri):include($$shadowed($$PWD)/config.pri)
 include($$LIVEKEYS_DEV_PATH/project/package.pri)
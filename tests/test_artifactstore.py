@@ -0,0 +1,79 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from livepm.lib.configuration import Configuration
+from livepm.lib.artifactstore import ArtifactStore
+
+class ArtifactStoreKeyTest(unittest.TestCase):
+
+    def release(self):
+        return Configuration({
+            "name" : "a",
+            "version" : "1.0.0",
+            "webpage" : "",
+            "components" : {},
+            "dependencies" : [],
+            "releases" : { "gcc" : { "compiler" : "gcc", "environment" : {}, "build" : [], "deploy" : [] } }
+        }).release('gcc')
+
+    def options(self, root, deploy):
+        return ArtifactStore.portable_options([
+            "BUILD_DEPENDENCIES=false",
+            "LIVEKEYS_BIN_PATH='" + root + "/build/livekeys/bin'",
+            "LIVEKEYS_DEV_PATH='" + root + "/dependencies/livekeys'",
+            "DEPLOY_TO_LIVEKEYS=" + ('true' if deploy else 'false')
+        ])
+
+    def test_workspaces_share_keys(self):
+        release = self.release()
+        self.assertEqual(
+            ArtifactStore.key('abc', release, self.options('/ws1', True), ['x']),
+            ArtifactStore.key('abc', release, self.options('/ws2', True), ['x']))
+
+    def test_deploying_to_livekeys_changes_key(self):
+        release = self.release()
+        self.assertNotEqual(
+            ArtifactStore.key('abc', release, self.options('/ws1', True), []),
+            ArtifactStore.key('abc', release, self.options('/ws1', False), []))
+
+    def test_revision_and_upstream_change_key(self):
+        release = self.release()
+        key = ArtifactStore.key('abc', release, [], ['x'])
+        self.assertNotEqual(key, ArtifactStore.key('abd', release, [], ['x']))
+        self.assertNotEqual(key, ArtifactStore.key('abc', release, [], ['y']))
+
+
+class ArtifactStoreRelocateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.store = ArtifactStore(os.path.join(self.root, 'store'))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_restored_release_dir_uses_new_paths(self):
+        first = os.path.join(self.root, 'ws1', 'build', 'a')
+        os.makedirs(first)
+        with open(os.path.join(first, 'config.pri'), 'w') as f:
+            f.write("LIVEKEYS_BIN_PATH = '" + self.root + "/ws1/build/livekeys/bin'\n")
+        with open(os.path.join(first, 'lib.so'), 'wb') as f:
+            f.write(b'\0' + (self.root + '/ws1/build').encode('utf-8'))
+        ArtifactStore.set_origin(first, { "build" : os.path.join(self.root, 'ws1', 'build') })
+        self.store.put('k', first)
+
+        second = os.path.join(self.root, 'ws2', 'build', 'a')
+        self.assertTrue(self.store.restore('k', second))
+        self.assertEqual(ArtifactStore.relocate(second, { "build" : os.path.join(self.root, 'ws2', 'build') }), 1)
+
+        with open(os.path.join(second, 'config.pri')) as f:
+            self.assertEqual(f.read(), "LIVEKEYS_BIN_PATH = '" + self.root + "/ws2/build/livekeys/bin'\n")
+        with open(os.path.join(self.store.entry_path('k'), 'config.pri')) as f:
+            self.assertIn('/ws1/', f.read())
+        with open(os.path.join(second, 'lib.so'), 'rb') as f:
+            self.assertIn(b'/ws1/', f.read())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from livepm.lib.configuration import Configuration
+from livepm.lib.buildfingerprint import BuildFingerprint
+
+class BuildFingerprintTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.sourcedir = os.path.join(self.root, 'source')
+        self.releasedir = os.path.join(self.root, 'release')
+        os.makedirs(self.sourcedir)
+        with open(os.path.join(self.sourcedir, 'a.cpp'), 'w') as f:
+            f.write('a')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def fingerprint(self, compiler = 'gcc'):
+        release = Configuration({
+            "name" : "a",
+            "version" : "1.0.0",
+            "webpage" : "",
+            "components" : {},
+            "dependencies" : [],
+            "releases" : { "gcc" : { "compiler" : compiler, "environment" : {}, "build" : [], "deploy" : [] } }
+        }).release('gcc')
+        return BuildFingerprint(release, self.sourcedir, ["BUILD_DEPENDENCIES=false"])
+
+    def test_release_dir_without_fingerprint(self):
+        self.assertIsNone(self.fingerprint().matches(self.releasedir))
+
+    def test_source_changes_keep_configuration(self):
+        self.fingerprint().save(self.releasedir)
+        with open(os.path.join(self.sourcedir, 'a.cpp'), 'w') as f:
+            f.write('b')
+        fingerprint = self.fingerprint()
+        self.assertTrue(fingerprint.matches(self.releasedir))
+        self.assertFalse(fingerprint.source_matches(self.releasedir))
+
+    def test_compiler_changes_configuration(self):
+        self.fingerprint().save(self.releasedir)
+        self.assertFalse(self.fingerprint('clang').matches(self.releasedir))
+
+if __name__ == '__main__':
+    unittest.main()
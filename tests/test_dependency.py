@@ -0,0 +1,105 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from livepm.lib.dependency import Dependency
+from livepm.lib.gitmirror import GitMirror
+
+class GitTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.origin = os.path.join(self.root, 'origin')
+        self.write(self.origin, 'live.json', '{}')
+        self.write(self.origin, 'src/a.cpp', 'a')
+        self.write(self.origin, 'data/big.bin', 'x' * 100000)
+        self.git(self.origin, 'init', '-q', '-b', 'dev')
+        self.git(self.origin, 'config', 'uploadpack.allowFilter', 'true')
+        self.git(self.origin, 'config', 'uploadpack.allowAnySHA1InWant', 'true')
+        self.commit(self.origin, 'a')
+        self.workspace = os.path.join(self.root, 'workspace')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, repodir, path, data):
+        os.makedirs(os.path.dirname(os.path.join(repodir, path)), exist_ok=True)
+        with open(os.path.join(repodir, path), 'w') as f:
+            f.write(data)
+
+    def git(self, repodir, *args):
+        return subprocess.run(
+            ['git', '-c', 'user.name=livepm', '-c', 'user.email=livepm@localhost'] + list(args),
+            cwd=repodir, check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+
+    def commit(self, repodir, message):
+        self.git(repodir, 'add', '-A')
+        self.git(repodir, 'commit', '-q', '-m', message)
+
+    def dependency(self, options = {}):
+        result = { "name" : "a", "version" : "1.0.0", "repository" : "file://" + self.origin }
+        result.update(options)
+        return Dependency(result)
+
+
+class SparseCloneTest(GitTestCase):
+
+    def test_sparse_paths_make_a_blobless_clone(self):
+        d = self.dependency({ "sparse" : ["src"] })
+        d(self.workspace, os.path.join(self.workspace, 'build'), 'gcc')
+
+        repodir = os.path.join(self.workspace, 'dependencies', 'a')
+        self.assertTrue(os.path.isfile(os.path.join(repodir, 'live.json')))
+        self.assertTrue(os.path.isfile(os.path.join(repodir, 'src', 'a.cpp')))
+        self.assertFalse(os.path.exists(os.path.join(repodir, 'data')))
+        self.assertEqual(self.git(repodir, 'config', 'remote.origin.partialclonefilter').strip(), 'blob:none')
+        missing = self.git(repodir, 'rev-list', '--objects', '--all', '--missing=print')
+        self.assertIn('?', missing)
+
+    def test_blobs_are_fetched_on_demand(self):
+        d = self.dependency({ "sparse" : ["src"] })
+        d(self.workspace, os.path.join(self.workspace, 'build'), 'gcc')
+
+        repodir = os.path.join(self.workspace, 'dependencies', 'a')
+        self.git(repodir, 'sparse-checkout', 'add', 'data')
+        with open(os.path.join(repodir, 'data', 'big.bin')) as f:
+            self.assertEqual(len(f.read()), 100000)
+
+class GitMirrorTest(GitTestCase):
+
+    def test_clone_references_mirror(self):
+        mirror = GitMirror(os.path.join(self.root, 'cache'))
+        d = self.dependency()
+        d(self.workspace, os.path.join(self.workspace, 'build'), 'gcc', { "mirror" : mirror })
+
+        path = mirror.path(d.repository)
+        self.assertTrue(os.path.isfile(os.path.join(path, 'HEAD')))
+        repodir = os.path.join(self.workspace, 'dependencies', 'a')
+        self.assertTrue(os.path.isfile(os.path.join(repodir, 'data', 'big.bin')))
+        # Dissociated clones don't need the mirror once they're made
+        self.assertFalse(os.path.exists(os.path.join(repodir, '.git', 'objects', 'info', 'alternates')))
+        self.assertEqual(self.git(repodir, 'rev-parse', 'HEAD'), self.git(self.origin, 'rev-parse', 'HEAD'))
+
+    def test_mirror_is_updated(self):
+        mirror = GitMirror(os.path.join(self.root, 'cache'))
+        path = mirror.update('file://' + self.origin)
+        self.write(self.origin, 'src/b.cpp', 'b')
+        self.commit(self.origin, 'b')
+
+        self.assertEqual(mirror.update('file://' + self.origin), path)
+        self.assertEqual(self.git(path, 'rev-parse', 'dev'), self.git(self.origin, 'rev-parse', 'HEAD'))
+
+    def test_shallow_clone_from_mirror(self):
+        self.write(self.origin, 'src/b.cpp', 'b')
+        self.commit(self.origin, 'b')
+        mirror = GitMirror(os.path.join(self.root, 'cache'))
+        d = self.dependency()
+        d(self.workspace, os.path.join(self.workspace, 'build'), 'gcc', { "mirror" : mirror, "depth" : 1 })
+
+        repodir = os.path.join(self.workspace, 'dependencies', 'a')
+        self.assertEqual(self.git(repodir, 'rev-list', '--count', 'HEAD').strip(), '1')
+
+if __name__ == '__main__':
+    unittest.main()
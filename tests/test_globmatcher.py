@@ -0,0 +1,23 @@
+import ntpath
+import unittest
+from unittest import mock
+
+from livepm.lib.globmatcher import GlobMatcher
+
+class GlobMatcherTest(unittest.TestCase):
+
+    def test_any_directories(self):
+        matcher = GlobMatcher(['**/*.pdb'])
+        self.assertTrue(matcher.matches('a.pdb'))
+        self.assertTrue(matcher.matches('bin/debug/a.pdb'))
+        self.assertFalse(matcher.matches('bin/a.dll'))
+
+    def test_windows_paths(self):
+        with mock.patch('os.path.normcase', ntpath.normcase):
+            matcher = GlobMatcher(['**/*.pdb', 'Bin\\*.LIB'])
+        self.assertTrue(matcher.matches('C:\\Build\\Bin\\A.PDB'))
+        self.assertTrue(matcher.matches('C:/Build/a.pdb'))
+        self.assertEqual(matcher.match('bin/a.lib'), 'Bin\\*.LIB')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import json
+import shutil
+import zipfile
+import tempfile
+import threading
+import unittest
+import http.server
+
+from livepm.lib.dependency import Dependency
+from livepm.lib.prebuiltrelease import PrebuiltRelease
+
+# Stands in for the registry, serving the release entries of packages and
+# their archives
+class RegistryHandler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        files = self.server.files
+        if self.path not in files:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(files[self.path])))
+        self.end_headers()
+        self.wfile.write(files[self.path])
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PrebuiltReleaseTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), RegistryHandler)
+        self.server.files = {}
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.url = 'http://127.0.0.1:' + str(self.server.server_address[1]) + '/api/'
+        self.releasedir = os.path.join(self.root, 'build', 'a')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        shutil.rmtree(self.root)
+
+    def dependency(self):
+        return Dependency({ "name" : "a", "version" : "1.0.0", "repository" : "file:///a" })
+
+    def publish(self, name):
+        archive = os.path.join(self.root, name)
+        with zipfile.ZipFile(archive, 'w') as z:
+            z.writestr('lib/liba.so', 'a')
+            info = zipfile.ZipInfo('bin/a')
+            info.external_attr = 0o755 << 16
+            z.writestr(info, '#!/bin/sh\n')
+        with open(archive, 'rb') as f:
+            self.server.files['/files/' + name] = f.read()
+        entry = { "url" : 'http://127.0.0.1:' + str(self.server.server_address[1]) + '/files/' + name, "version" : "1.0.0" }
+        self.server.files['/api/package/a/release/1.0.0/' + PrebuiltRelease.platform_name()] = json.dumps(entry).encode('utf-8')
+
+    def test_unpacks_dev_release(self):
+        self.publish('a-1.zip')
+        self.assertTrue(PrebuiltRelease(self.url)(self.dependency(), self.releasedir))
+        with open(os.path.join(self.releasedir, 'lib', 'liba.so')) as f:
+            self.assertEqual(f.read(), 'a')
+        self.assertTrue(os.access(os.path.join(self.releasedir, 'bin', 'a'), os.X_OK))
+        with open(PrebuiltRelease.marker_path(self.releasedir)) as f:
+            self.assertTrue(json.load(f)['url'].endswith('/files/a-1.zip'))
+
+    def test_up_to_date_release_is_kept(self):
+        self.publish('a-1.zip')
+        PrebuiltRelease(self.url)(self.dependency(), self.releasedir)
+        with open(os.path.join(self.releasedir, 'kept'), 'w') as f:
+            f.write('')
+        self.assertTrue(PrebuiltRelease(self.url)(self.dependency(), self.releasedir))
+        self.assertTrue(os.path.isfile(os.path.join(self.releasedir, 'kept')))
+
+        self.publish('a-2.zip')
+        self.assertTrue(PrebuiltRelease(self.url)(self.dependency(), self.releasedir))
+        self.assertFalse(os.path.exists(os.path.join(self.releasedir, 'kept')))
+
+    def test_missing_release_falls_back_to_source(self):
+        self.assertFalse(PrebuiltRelease(self.url)(self.dependency(), self.releasedir))
+        self.assertFalse(os.path.exists(self.releasedir))
+
+if __name__ == '__main__':
+    unittest.main()
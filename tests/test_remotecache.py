@@ -0,0 +1,101 @@
+import io
+import os
+import json
+import socket
+import shutil
+import tarfile
+import hashlib
+import subprocess
+import tempfile
+import threading
+import unittest
+
+from livepm.lib.builder import Builder
+from livepm.lib.remotecache import RemoteCache
+from livepm.lib.remotecacheserver import RemoteCacheServer
+
+class RemoteCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.server = RemoteCacheServer(('127.0.0.1', 0), os.path.join(self.root, 'server'))
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.cache = RemoteCache('http://127.0.0.1:' + str(self.server.server_address[1]), timeout = 10)
+        self.key = hashlib.sha256(b'a').hexdigest()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        shutil.rmtree(self.root)
+
+    def release_dir(self, name):
+        releasedir = os.path.join(self.root, name)
+        os.makedirs(os.path.join(releasedir, 'bin'))
+        with open(os.path.join(releasedir, 'bin', 'a.so'), 'w') as f:
+            f.write('a')
+        return releasedir
+
+    def test_round_trip(self):
+        self.assertTrue(self.cache.put(self.key, self.release_dir('built')))
+        restored = os.path.join(self.root, 'restored')
+        self.assertTrue(self.cache.get(self.key, restored))
+        with open(os.path.join(restored, 'bin', 'a.so')) as f:
+            self.assertEqual(f.read(), 'a')
+
+    def test_missing_artifact_is_a_miss(self):
+        self.assertFalse(self.cache.get(self.key, os.path.join(self.root, 'restored')))
+
+    def test_wrong_digest_is_rejected(self):
+        data = io.BytesIO()
+        with tarfile.open(fileobj=data, mode='w:gz') as tar:
+            tar.add(self.release_dir('built'), arcname='.')
+        path = os.path.join(self.server.storedir, self.key + '.tar.gz')
+        with open(path, 'wb') as f:
+            f.write(data.getvalue())
+        with open(path + '.sha256', 'w') as f:
+            f.write(hashlib.sha256(b'other').hexdigest())
+
+        restored = os.path.join(self.root, 'restored')
+        self.assertFalse(self.cache.get(self.key, restored))
+        self.assertFalse(os.path.exists(restored))
+
+    def package(self, path, name, build):
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, 'live.json'), 'w') as f:
+            json.dump({
+                "name" : name,
+                "version" : "1.0.0",
+                "webpage" : "",
+                "components" : {},
+                "dependencies" : [],
+                "releases" : { "gcc" : { "compiler" : "gcc", "environment" : {}, "build" : build, "deploy" : [] } }
+            }, f)
+
+    def test_server_down_falls_back_to_building(self):
+        s = socket.socket()
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+        s.close()
+
+        sourcedir = os.path.join(self.root, 'workspace')
+        builddir = os.path.join(sourcedir, 'build', 'gcc')
+        dependency = os.path.join(sourcedir, 'dependencies', 'a')
+        self.package(sourcedir, 'root', [])
+        self.package(dependency, 'a', [{ "run" : ["sh", "-c", "mkdir -p lib && echo a > lib/a.so"] }])
+        git = ['git', '-c', 'user.name=livepm', '-c', 'user.email=livepm@localhost']
+        subprocess.run(git + ['init', '-q'], cwd=dependency, check=True)
+        subprocess.run(git + ['add', '-A'], cwd=dependency, check=True)
+        subprocess.run(git + ['commit', '-q', '-m', 'a'], cwd=dependency, check=True)
+
+        b = Builder(sourcedir, 'gcc')
+        b.quiet = True
+        b.remote_cache = RemoteCache('http://127.0.0.1:' + str(port), timeout = 10)
+        b.build_dependency('a', { 'a' : [] }, sourcedir, builddir, {})
+        self.assertIsNotNone(b.artifact_keys['a'])
+        with open(os.path.join(builddir, 'a', 'lib', 'a.so')) as f:
+            self.assertEqual(f.read(), 'a\n')
+
+if __name__ == '__main__':
+    unittest.main()